@@ -1,8 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
+from typing import Dict, Iterator, Optional
 from openai import OpenAI
 import os
 from dotenv import load_dotenv
+from cache import SQLiteCache
 
 load_dotenv()
 
@@ -10,14 +11,29 @@ class AIProvider(ABC):
     """Abstract base class for AI providers"""
     
     @abstractmethod
-    def generate_completion(self, prompt: str) -> str:
-        """Generate completion from prompt"""
+    def generate_completion(self, prompt: str, **options) -> str:
+        """Generate completion from prompt
+        
+        ``options`` are extra request parameters such as ``response_format``
+        or ``max_tokens``; providers ignore the ones they don't support.
+        """
         pass
+    
+    def stream_completion(self, prompt: str, **options) -> Iterator[str]:
+        """Yield the completion in chunks as it is generated.
+        
+        Providers without streaming support yield the whole completion at once.
+        """
+        yield self.generate_completion(prompt, **options)
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant that creates engaging Twitter threads."
 
 class PerplexityProvider(AIProvider):
     """Perplexity implementation using official API"""
     
-    def __init__(self):
+    def __init__(self, model: str = "sonar-pro", system_prompt: str = DEFAULT_SYSTEM_PROMPT):
+        self.model = model
+        self.system_prompt = system_prompt
         self.api_key = os.getenv("PPLX_API_KEY")
         self.client = OpenAI(
             api_key=self.api_key, 
@@ -32,26 +48,28 @@ class PerplexityProvider(AIProvider):
         """No-op for API-based provider"""
         pass
     
-    def generate_completion(self, prompt: str) -> str:
+    def _messages(self, prompt: str):
+        return [
+            {
+                "role": "system",
+                "content": self.system_prompt
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    def generate_completion(self, prompt: str, **options) -> str:
         """Generate completion using Perplexity API"""
         try:
             print("\n🤖 Generating content...")
             print("⏳ This may take a few moments...\n")
             
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that creates engaging Twitter threads."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-            
             response = self.client.chat.completions.create(
-                model="sonar-pro",
-                messages=messages,
+                model=self.model,
+                messages=self._messages(prompt),
+                **options
             )
             
             print("✅ Content generation complete!\n")
@@ -60,6 +78,124 @@ class PerplexityProvider(AIProvider):
         except Exception as e:
             print(f"❌ Error generating completion: {e}")
             return ""
+    
+    def stream_completion(self, prompt: str, **options) -> Iterator[str]:
+        """Stream completion chunks from the Perplexity API as they arrive
+        
+        Raises if the request fails, including midway through the stream.
+        """
+        try:
+            print("\n🤖 Streaming content...\n")
+            
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=self._messages(prompt),
+                stream=True,
+                **options
+            )
+            
+            try:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Also runs when the caller stops reading early, so the request is dropped
+                stream.close()
+            
+            print("✅ Content generation complete!\n")
+            
+        except Exception as e:
+            print(f"❌ Error streaming completion: {e}")
+            # Let callers (and the cache) know the text they got is incomplete
+            raise
+
+class CachedProvider(AIProvider):
+    """Wraps any AIProvider with a persistent on-disk response cache
+    
+    Responses are keyed on the wrapped provider's model, system prompt, the
+    user prompt and any request options. Set ``bypass`` (or
+    LLM_CACHE_BYPASS=1) to always call through to the provider; fresh
+    responses are still stored. Streams are only stored once they end cleanly.
+    """
+    
+    def __init__(self, provider: AIProvider, path: Optional[str] = None,
+                 ttl: Optional[float] = None, max_entries: Optional[int] = None,
+                 bypass: Optional[bool] = None):
+        self.provider = provider
+        self.cache = SQLiteCache(
+            path or os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3"),
+            table="completions",
+            ttl=ttl if ttl is not None else float(os.getenv("LLM_CACHE_TTL", "86400")),
+            max_entries=max_entries or int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500"))
+        )
+        if bypass is None:
+            bypass = os.getenv("LLM_CACHE_BYPASS", "0") == "1"
+        self.bypass = bypass
+    
+    @property
+    def model(self):
+        return getattr(self.provider, "model", type(self.provider).__name__)
+    
+    @property
+    def system_prompt(self):
+        return getattr(self.provider, "system_prompt", "")
+    
+    def cache_key(self, prompt: str, options: Optional[Dict] = None) -> str:
+        if not options:
+            # Same key as before options existed, so plain completions stay cached
+            return SQLiteCache.make_key(self.model, self.system_prompt, prompt)
+        return SQLiteCache.make_key(self.model, self.system_prompt, prompt, options)
+    
+    def start(self):
+        if hasattr(self.provider, "start"):
+            self.provider.start()
+    
+    def close(self):
+        if hasattr(self.provider, "close"):
+            self.provider.close()
+    
+    def _lookup(self, prompt: str, options: Dict) -> Optional[str]:
+        if self.bypass:
+            return None
+        cached = self.cache.get(self.cache_key(prompt, options))
+        if cached is not None:
+            print("⚡ Using cached completion")
+        return cached
+    
+    def _store(self, prompt: str, options: Dict, response: str):
+        # Empty responses mean the provider failed; don't remember those
+        if response:
+            self.cache.set(self.cache_key(prompt, options), response)
+    
+    def invalidate(self, prompt: str, **options):
+        """Forget the cached response for a prompt (e.g. when it failed to parse)"""
+        self.cache.delete(self.cache_key(prompt, options))
+    
+    def generate_completion(self, prompt: str, **options) -> str:
+        cached = self._lookup(prompt, options)
+        if cached is not None:
+            return cached
+        
+        response = self.provider.generate_completion(prompt, **options)
+        self._store(prompt, options, response)
+        return response
+    
+    def stream_completion(self, prompt: str, **options) -> Iterator[str]:
+        cached = self._lookup(prompt, options)
+        if cached is not None:
+            yield cached
+            return
+        
+        chunks = []
+        # An exception or an early close skips the store, so partial text is never cached
+        for chunk in self.provider.stream_completion(prompt, **options):
+            chunks.append(chunk)
+            yield chunk
+        self._store(prompt, options, ''.join(chunks))
+    
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and entry count of the underlying cache"""
+        return self.cache.stats()
 
 class AnthropicProvider(AIProvider):
     """Anthropic Claude implementation"""
@@ -68,7 +204,7 @@ class AnthropicProvider(AIProvider):
         self.api_key = api_key
         # Initialize Anthropic client here
     
-    def generate_completion(self, prompt: str) -> str:
+    def generate_completion(self, prompt: str, **options) -> str:
         """Generate completion using Anthropic Claude"""
         # Implement Anthropic API call
         pass
@@ -80,7 +216,7 @@ class OpenAIProvider(AIProvider):
         self.api_key = api_key
         # Initialize OpenAI client here
     
-    def generate_completion(self, prompt: str) -> str:
+    def generate_completion(self, prompt: str, **options) -> str:
         """Generate completion using OpenAI"""
         # Implement OpenAI API call
         pass 
\ No newline at end of file
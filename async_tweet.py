@@ -0,0 +1,404 @@
+import asyncio
+import os
+import sys
+import time
+from playwright.async_api import async_playwright
+from media_store import MediaStore
+from resource_blocking import RequestRouter
+from post_capture import PostRejected, is_create_tweet, parse_create_tweet
+from thread_progress import ThreadProgress
+import browser_config
+from tweet import HOME_URL, FILE_INPUT, OVERLAY_SELECTORS, POST_BUTTON_SELECTORS, XAutomation
+
+# Saved sessions (Playwright storage state) live here as <account>.json
+ACCOUNTS_DIR = os.getenv("X_ACCOUNTS_DIR", "./accounts")
+
+
+class AsyncXAutomation:
+    """asyncio version of XAutomation that posts for several accounts from one process.
+
+    Every account gets its own isolated browser context. Accounts backed by a
+    storage state file share one Chromium; an account backed by a profile
+    directory gets its own persistent context. ``accounts`` maps an account
+    name to either kind of path.
+    """
+
+    def __init__(self, accounts=None, per_account_concurrency=None, step_timeout=None, headless=None):
+        self.accounts = dict(accounts or {})
+        if per_account_concurrency is None:
+            per_account_concurrency = int(os.getenv("X_ACCOUNT_CONCURRENCY", "1"))
+        self.per_account_concurrency = per_account_concurrency
+        self.step_timeout = step_timeout or int(os.getenv("X_STEP_TIMEOUT", "15000"))
+        self.headless = browser_config.headless(headless)
+        self.playwright = None
+        self.browser = None
+        self.contexts = {}
+        self.routers = {}
+        self.step_latencies = {}
+        self.media_store = None
+        self._slots = {}
+        self._context_locks = {}
+
+    async def start(self):
+        """Start playwright; contexts are opened on the first post for each account"""
+        if not self.playwright:
+            self.playwright = await async_playwright().start()
+
+    def _account_path(self, account):
+        if account in self.accounts:
+            return self.accounts[account]
+        return os.path.join(ACCOUNTS_DIR, f"{account}.json")
+
+    def _slot(self, account):
+        """Semaphore limiting how many posts run at once for ``account``"""
+        if account not in self._slots:
+            self._slots[account] = asyncio.Semaphore(self.per_account_concurrency)
+        return self._slots[account]
+
+    async def _context(self, account):
+        """Return the context for ``account``, opening it on first use"""
+        lock = self._context_locks.setdefault(account, asyncio.Lock())
+        async with lock:
+            if account in self.contexts:
+                return self.contexts[account]
+            await self.start()
+            path = self._account_path(account)
+            if os.path.isdir(path):
+                context = await self.playwright.chromium.launch_persistent_context(
+                    user_data_dir=path,
+                    **browser_config.launch_options(self.headless),
+                    **browser_config.context_options()
+                )
+            else:
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"No session for account '{account}' at {path}")
+                if not self.browser:
+                    self.browser = await self.playwright.chromium.launch(
+                        **browser_config.launch_options(self.headless)
+                    )
+                context = await self.browser.new_context(
+                    storage_state=path,
+                    **browser_config.context_options()
+                )
+            if os.getenv("BLOCK_RESOURCES", "1") == "1":
+                self.routers[account] = await RequestRouter().install(context)
+            self.contexts[account] = context
+            print(f"Opened browser context for @{account}")
+            return context
+
+    async def _open_page(self, account):
+        context = await self._context(account)
+        page = await context.new_page()
+        await page.goto(HOME_URL, wait_until='domcontentloaded')
+        await self._wait_step(
+            account, "home composer ready",
+            lambda timeout: page.wait_for_selector('[data-testid="tweetTextarea_0"]', timeout=timeout)
+        )
+        return page
+
+    async def _wait_step(self, account, name, wait, timeout=None):
+        """Await a readiness wait with a timeout and record how long it took"""
+        start = time.perf_counter()
+        try:
+            return await wait(timeout or self.step_timeout)
+        finally:
+            self.step_latencies.setdefault(account, []).append((name, time.perf_counter() - start))
+
+    def latency_report(self, account):
+        """Print and clear the per-step wait latencies recorded for ``account``"""
+        latencies = self.step_latencies.pop(account, [])
+        if not latencies:
+            return []
+        print(f"\n=== Step latencies (@{account}) ===")
+        for name, seconds in latencies:
+            print(f"{seconds * 1000:8.0f} ms  {name}")
+        total = sum(seconds for _, seconds in latencies)
+        print(f"{total * 1000:8.0f} ms  total waiting")
+        print("======================\n")
+        return latencies
+
+    async def _wait_for_any(self, page, selectors, timeout):
+        locator = page.locator(', '.join(selectors)).first
+        await locator.wait_for(state='visible', timeout=timeout)
+        return locator
+
+    async def _wait_for_attachments(self, page, count, timeout):
+        await page.wait_for_function(
+            """n => document.querySelectorAll('[data-testid="attachments"] img, '
+                + '[data-testid="attachments"] video').length >= n""",
+            arg=count,
+            timeout=timeout
+        )
+
+    async def _resolve_image(self, image_path):
+        """Turn an image URL into a stored local file; local paths pass through"""
+        if not image_path.startswith(('http://', 'https://')):
+            return image_path
+        if not self.media_store:
+            self.media_store = MediaStore()
+        stored_path = await asyncio.to_thread(self.media_store.fetch, image_path)
+        if not stored_path:
+            raise Exception("Failed to download image")
+        return stored_path
+
+    async def _click_and_confirm(self, account, page, post_button, count=1):
+        """Click Post and wait for X's CreateTweet answers for ``count`` tweets
+        
+        Returns [{'id', 'url'}] in thread order; raises PostRejected when X
+        refuses a tweet and TimeoutError when it doesn't answer in time.
+        """
+        responses = asyncio.Queue()
+
+        def on_response(response):
+            if is_create_tweet(response):
+                responses.put_nowait(response)
+
+        async def confirmed(timeout):
+            tweets = []
+            deadline = time.monotonic() + timeout / 1000
+            while len(tweets) < count:
+                remaining = deadline - time.monotonic()
+                try:
+                    response = await asyncio.wait_for(responses.get(), max(remaining, 0))
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"X confirmed {len(tweets)} of {count} tweets within {timeout / 1000:.1f}s")
+                try:
+                    body = await response.json()
+                except Exception:
+                    raise PostRejected(f"HTTP {response.status} with an unreadable body")
+                tweet_id, url = parse_create_tweet(body)
+                tweets.append({'id': tweet_id, 'url': url})
+            return tweets
+
+        page.on('response', on_response)
+        try:
+            await post_button.click(force=True)
+            return await self._wait_step(account, "post confirmed", confirmed)
+        finally:
+            page.remove_listener('response', on_response)
+
+    async def post_tweet(self, account, text):
+        """Post a single tweet; returns {'id', 'url'} once X confirms it, else None"""
+        async with self._slot(account):
+            page = None
+            try:
+                page = await self._open_page(account)
+                await page.fill('div[role="textbox"]', text)
+                post_button = await self._wait_step(
+                    account, "post button enabled",
+                    lambda timeout: self._wait_for_any(page, POST_BUTTON_SELECTORS, timeout)
+                )
+                tweet = (await self._click_and_confirm(account, page, post_button))[0]
+                print(f"Tweet posted successfully for @{account}! {tweet['url']}")
+                return tweet
+            except Exception as e:
+                print(f"Error posting tweet for @{account}: {e}")
+                return None
+            finally:
+                if page:
+                    await page.close()
+
+    async def post_tweet_with_image(self, account, text, image_path):
+        """Post a tweet with an image (local path or URL); returns {'id', 'url'} or None"""
+        async with self._slot(account):
+            page = None
+            try:
+                image_path = await self._resolve_image(image_path)
+                page = await self._open_page(account)
+                await page.fill('div[role="textbox"]', text)
+                await page.set_input_files(FILE_INPUT, image_path)
+                await self._wait_step(
+                    account, "media preview rendered",
+                    lambda timeout: self._wait_for_attachments(page, 1, timeout)
+                )
+                post_button = await self._wait_step(
+                    account, "post button enabled",
+                    lambda timeout: self._wait_for_any(page, POST_BUTTON_SELECTORS, timeout)
+                )
+                tweet = (await self._click_and_confirm(account, page, post_button))[0]
+                print(f"Tweet with image posted successfully for @{account}! {tweet['url']}")
+                return tweet
+            except Exception as e:
+                print(f"Error posting tweet with image for @{account}: {e}")
+                return None
+            finally:
+                if page:
+                    await page.close()
+
+    async def _dismiss_overlay(self, account, page):
+        """Click away a visible hashtag typeahead, if any"""
+        for selector in OVERLAY_SELECTORS:
+            overlay = page.locator(selector).first
+            try:
+                if await overlay.is_visible():
+                    await page.click('div[data-testid="cellInnerDiv"]')
+                    await self._wait_step(
+                        account, "overlay detached",
+                        lambda timeout: overlay.wait_for(state='hidden', timeout=timeout)
+                    )
+                    return True
+            except Exception:
+                continue
+        return False
+
+    async def _fill_tweet(self, account, page, element, text):
+        """Fill one composer box; a trailing hashtag gets a space so its typeahead closes"""
+        words = text.strip().split()
+        if words and words[-1].startswith('#'):
+            text = f"{text.strip()} "
+        await element.click()
+        await element.fill(text)
+        await self._wait_step(
+            account, "text committed",
+            lambda timeout: page.wait_for_function(
+                "el => el.innerText.trim().length > 0", arg=element, timeout=timeout
+            )
+        )
+
+    async def _add_tweet_box(self, account, page, index):
+        add_button = await self._wait_step(
+            account, "add button visible",
+            lambda timeout: page.wait_for_selector('[data-testid="addButton"]', timeout=timeout, state='visible')
+        )
+        await add_button.click(force=True)
+        return await self._wait_step(
+            account, f"tweetTextarea_{index} attached",
+            lambda timeout: page.wait_for_selector(f'[data-testid="tweetTextarea_{index}"]', timeout=timeout)
+        )
+
+    async def post_thread(self, account, tweets, image_paths=None):
+        """Post ``tweets`` as a thread from ``account``; raises on failure like XAutomation
+
+        Images are matched to tweets by their tweet_<i> name, as in XAutomation.
+        Returns the same result dict as XAutomation.post_thread once X has
+        confirmed every tweet. Unlike the sync poster there are no progress.json
+        checkpoints: a failed thread isn't resumed or chunked.
+        """
+        async with self._slot(account):
+            self.step_latencies.pop(account, None)
+            page = None
+            try:
+                page = await self._open_page(account)
+                aligned = XAutomation._align_images(len(tweets), image_paths)
+                uploaded = 0
+                for i, text in enumerate(tweets):
+                    if i == 0:
+                        box = await page.wait_for_selector('[data-testid="tweetTextarea_0"]')
+                    else:
+                        box = await self._add_tweet_box(account, page, i)
+                    await self._fill_tweet(account, page, box, text)
+
+                    image_path = aligned[i]
+                    if image_path and os.path.exists(image_path):
+                        if i == 0:
+                            await page.set_input_files(FILE_INPUT, image_path)
+                        else:
+                            current = page.locator(f'[data-testid="tweetTextarea_{i}"]')
+                            file_input = current.locator('xpath=./following::input[@data-testid="fileInput"]').first
+                            await file_input.set_input_files(image_path)
+                        uploaded += 1
+                        await self._wait_step(
+                            account, f"media preview {i+1} rendered",
+                            lambda timeout: self._wait_for_attachments(page, uploaded, timeout)
+                        )
+
+                    await self._dismiss_overlay(account, page)
+
+                post_button = await self._wait_step(
+                    account, "post button enabled",
+                    lambda timeout: self._wait_for_any(
+                        page, ['[data-testid="tweetButton"]:not([aria-disabled="true"])'], timeout
+                    )
+                )
+                progress = ThreadProgress(tweets)
+                progress.mark_posted(await self._click_and_confirm(account, page, post_button, len(tweets)))
+                result = progress.result(tweets)
+                print(f"Thread posted successfully for @{account}! {result['thread_url']}")
+                self.latency_report(account)
+                return result
+            except Exception as e:
+                print(f"Error posting thread for @{account}: {e}")
+                self.latency_report(account)
+                raise
+            finally:
+                if page:
+                    await page.close()
+
+    async def close(self):
+        """Close every account context, the shared browser and playwright"""
+        for account, context in list(self.contexts.items()):
+            try:
+                await context.close()
+            except Exception as e:
+                print(f"Error closing context for @{account}: {e}")
+        self.contexts = {}
+        self.routers = {}
+        if self.browser:
+            await self.browser.close()
+            self.browser = None
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
+
+
+async def export_session(user_data_dir, account):
+    """Save the logged-in session of a Chrome profile as accounts/<account>.json"""
+    os.makedirs(ACCOUNTS_DIR, exist_ok=True)
+    path = os.path.join(ACCOUNTS_DIR, f"{account}.json")
+    async with async_playwright() as playwright:
+        context = await playwright.chromium.launch_persistent_context(
+            user_data_dir=user_data_dir,
+            **browser_config.launch_options(),
+            **browser_config.context_options()
+        )
+        await context.storage_state(path=path)
+        await context.close()
+    print(f"Saved session for @{account} to {path}")
+    return path
+
+
+async def post_threads(jobs, per_account_concurrency=None):
+    """Post ``(account, tweets, image_paths)`` jobs concurrently; returns one result per job"""
+    bot = AsyncXAutomation(per_account_concurrency=per_account_concurrency)
+    try:
+        return await asyncio.gather(
+            *(bot.post_thread(account, tweets, image_paths) for account, tweets, image_paths in jobs),
+            return_exceptions=True
+        )
+    finally:
+        await bot.close()
+
+
+def main():
+    """Usage:
+    python async_tweet.py export <user_data_dir> <account>
+    python async_tweet.py post <account>:<thread_folder> [<account>:<thread_folder> ...]
+    """
+    if len(sys.argv) >= 4 and sys.argv[1] == "export":
+        asyncio.run(export_session(sys.argv[2], sys.argv[3]))
+        return
+    if len(sys.argv) < 3 or sys.argv[1] != "post":
+        print(main.__doc__)
+        return
+
+    from thread_manager import ThreadManager
+    loader = ThreadManager()
+    jobs = []
+    for spec in sys.argv[2:]:
+        account, _, folder = spec.partition(':')
+        thread_dir = os.path.join("threads", folder)
+        thread_data = loader._load_thread_from_markdown(thread_dir)
+        image_dir = os.path.join(thread_dir, "images")
+        image_files = sorted(
+            os.path.join(image_dir, f) for f in os.listdir(image_dir) if f.startswith("tweet_")
+        ) if os.path.exists(image_dir) else []
+        jobs.append((account, thread_data['tweets'], image_files))
+
+    results = asyncio.run(post_threads(jobs))
+    for result, spec in zip(results, sys.argv[2:]):
+        status = f"posted {result['thread_url']}" if not isinstance(result, Exception) else f"failed: {result}"
+        print(f"{spec}: {status}")
+
+
+if __name__ == "__main__":
+    main()
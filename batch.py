@@ -0,0 +1,229 @@
+"""Unattended batch mode: generate, illustrate and post one thread per JSONL job.
+
+Each line of the jobs file is a JSON object such as
+    {"id": "ai-chips", "topic": "The AI chip race", "num_tweets": 8, "images": true, "post": true}
+Only ``topic`` is required. One result record is appended to the results file
+per job, with its status and how long each stage took.
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime
+from thread_generator import ThreadGenerator
+from thread_manager import ThreadManager
+from find_photo import GoogleImageFinder
+from tweet import XAutomation
+from pipeline import Pipeline, Stage
+
+
+def read_jobs(path):
+    """Yield jobs from a JSONL file, one per non-empty line"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {'id': str(line_number), 'error': f"invalid JSON: {e}"}
+                continue
+            job.setdefault('id', str(line_number))
+            if not job.get('topic'):
+                job['error'] = "missing topic"
+            yield job
+
+
+class BatchRunner:
+    """Runs jobs through a generate → parse → images → post pipeline"""
+
+    def __init__(self, results_path, generate_workers=2, image_workers=1, post=True, queue_size=2):
+        self.results_path = results_path
+        self.generate_workers = generate_workers
+        self.image_workers = image_workers
+        self.post = post
+        self.queue_size = queue_size
+        # Only used for its thread folder and image helpers; every stage worker owns its own clients
+        self.manager = ThreadManager()
+        self._results_lock = threading.Lock()
+        self.counts = {'posted': 0, 'drafted': 0, 'failed': 0}
+
+    def _timed(self, record, stage, work):
+        start = time.perf_counter()
+        try:
+            return work()
+        finally:
+            record['timings'][stage] = round(time.perf_counter() - start, 3)
+
+    def _generate(self, record, generator):
+        job = record['job']
+        num_tweets = job.get('num_tweets', 10)
+        if generator.uses_outline(num_tweets) or generator.speculative > 1:
+            # Outlined and raced threads come back already split into tweets
+            record['thread'] = self._timed(
+                record, 'generate', lambda: generator.generate_thread(job['topic'], num_tweets)
+            )
+            if record['thread'] is None:
+                raise RuntimeError("no tweets in the response")
+            return record
+        record['prompt'], record['response'] = self._timed(
+            record, 'generate',
+            lambda: generator.complete(job['topic'], num_tweets=num_tweets)
+        )
+        return record
+
+    def _parse(self, record, generator):
+        def work():
+            job = record['job']
+            thread_data = record.pop('thread', None)
+            if thread_data is None:
+                thread_data = generator.parse(record.pop('prompt'), record.pop('response'), job.get('num_tweets', 10))
+            if thread_data is None:
+                raise RuntimeError("no tweets in the response")
+            thread_data = generator.repair_thread(job['topic'], thread_data)
+            record['missing'] = thread_data['missing']
+            thread_dir = self.manager._save_thread_preview(job['topic'], thread_data)
+            record['thread_dir'] = thread_dir
+            record['thread_data'] = self.manager._load_thread_from_markdown(thread_dir)
+
+        self._timed(record, 'parse', work)
+        return record
+
+    def _images(self, record, finder):
+        if record['job'].get('images', True):
+            record['image_paths'] = self._timed(
+                record, 'images',
+                lambda: self.manager.collect_images(record['thread_data'], finder)
+            )
+        return record
+
+    def _post(self, record, poster):
+        if not (self.post and record['job'].get('post', True)):
+            return record
+        if record.get('missing'):
+            # A numbered thread with holes must not go out unattended; leave it as a draft
+            record['held'] = f"tweets {', '.join(map(str, record['missing']))} still missing after repair"
+            print(f"✗ Not posting {record['job'].get('id')}: {record['held']}")
+            return record
+
+        def work():
+            poster.start()
+            try:
+                record['posted'] = poster.post_thread(
+                    tweets=record['thread_data']['tweets'],
+                    image_paths=record.get('image_paths'),
+                    thread_dir=record['thread_dir']
+                )
+            finally:
+                poster.close()
+
+        self._timed(record, 'post', work)
+        return record
+
+    def _new_finder(self):
+        return GoogleImageFinder()
+
+    def _new_poster(self):
+        return XAutomation(keep_browser=True)
+
+    def _failed(self, record, stage, error):
+        record['failed_stage'] = stage
+        self._finish(record, error)
+
+    def _finish(self, record, error=None):
+        job = record['job']
+        if error:
+            status = 'failed'
+        elif record.get('held'):
+            status = 'drafted'
+        elif self.post and job.get('post', True):
+            status = 'posted'
+        else:
+            status = 'drafted'
+        result = {
+            'id': job.get('id'),
+            'topic': job.get('topic'),
+            'status': status,
+            'thread_dir': record.get('thread_dir'),
+            'images': sum(1 for path in record.get('image_paths') or [] if path),
+            'thread_url': (record.get('posted') or {}).get('thread_url'),
+            'missing_tweets': record.get('missing', []),
+            'timings': record['timings'],
+            'finished_at': datetime.now().isoformat(timespec='seconds')
+        }
+        if record.get('held'):
+            result['held'] = record['held']
+        if error:
+            result['failed_stage'] = record.get('failed_stage')
+            result['error'] = str(error)
+        with self._results_lock:
+            self.counts[status] += 1
+            with open(self.results_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(result) + "\n")
+        mark = "✓" if not error else "✗"
+        print(f"{mark} [{result['id']}] {status}: {job.get('topic')}" + (f" ({error})" if error else ""))
+
+    def build_pipeline(self):
+        return Pipeline(
+            [
+                Stage('generate', self._generate, workers=self.generate_workers,
+                      queue_size=self.queue_size, setup=ThreadGenerator),
+                # Parsing is cheap but repairs are model calls, so parse gets the same workers
+                Stage('parse', self._parse, workers=self.generate_workers,
+                      queue_size=self.queue_size, setup=ThreadGenerator),
+                Stage('images', self._images, workers=self.image_workers, queue_size=self.queue_size,
+                      setup=self._new_finder, teardown=lambda finder: finder.close()),
+                Stage('post', self._post, queue_size=self.queue_size,
+                      setup=self._new_poster, teardown=lambda poster: poster.shutdown())
+            ],
+            on_done=self._finish,
+            on_error=self._failed
+        )
+
+    def run(self, jobs):
+        """Stream ``jobs`` into the pipeline; reading pauses while the first stage is full"""
+        started = time.perf_counter()
+        pipeline = self.build_pipeline().start()
+        try:
+            for job in jobs:
+                record = {'job': job, 'timings': {}}
+                if job.get('error'):
+                    self._finish(record, job['error'])
+                    continue
+                pipeline.submit(record)
+        finally:
+            pipeline.close()
+            self.manager.close()
+
+        pipeline.report()
+        elapsed = time.perf_counter() - started
+        total = sum(self.counts.values())
+        print(f"Batch finished: {total} jobs in {elapsed:.0f}s "
+              f"({self.counts['posted']} posted, {self.counts['drafted']} drafted, "
+              f"{self.counts['failed']} failed)")
+        return dict(self.counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and post threads from a JSONL jobs file")
+    parser.add_argument('jobs', help="JSONL file with one job per line")
+    parser.add_argument('--results', default='batch_results.jsonl', help="JSONL file results are appended to")
+    parser.add_argument('--generate-workers', type=int, default=2)
+    parser.add_argument('--image-workers', type=int, default=1)
+    parser.add_argument('--queue-size', type=int, default=2, help="Threads allowed to wait between two stages")
+    parser.add_argument('--no-post', action='store_true', help="Only save drafts and images")
+    args = parser.parse_args()
+
+    runner = BatchRunner(
+        args.results,
+        generate_workers=args.generate_workers,
+        image_workers=args.image_workers,
+        post=not args.no_post,
+        queue_size=args.queue_size
+    )
+    runner.run(read_jobs(args.jobs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Compare headed vs headless latency for image search and thread composing
+
+Usage: python benchmark_headless.py [runs]
+
+Posting is measured as a dry run: the thread is composed (text filled, tweet
+boxes added) but never posted. Headed mode needs a display; if it can't
+start, its column is reported as failed.
+"""
+import os
+import statistics
+import sys
+import time
+from find_photo import GoogleImageFinder
+from tweet import XAutomation
+
+QUERIES = [
+    "UFC gloves evolution history",
+    "Art Jimmerson one glove UFC 1",
+    "Modern UFC gloves"
+]
+TWEETS = [
+    "1/3 Benchmark draft, never posted",
+    "2/3 Second tweet of the benchmark draft",
+    "3/3 Last tweet of the benchmark draft #benchmark"
+]
+
+
+def time_search(headless):
+    timings = {}
+    finder = GoogleImageFinder(use_cache=False, rank=False, headless=headless)
+    try:
+        start = time.perf_counter()
+        finder._ensure_page()
+        timings['search: browser start'] = time.perf_counter() - start
+        
+        per_query = []
+        for query in QUERIES:
+            start = time.perf_counter()
+            finder.search_image_candidates(query)
+            per_query.append(time.perf_counter() - start)
+        timings['search: per query'] = statistics.median(per_query)
+    finally:
+        finder.close()
+    return timings
+
+
+def time_compose(headless):
+    timings = {}
+    bot = XAutomation(headless=headless, keep_browser=False)
+    try:
+        start = time.perf_counter()
+        bot.start()
+        timings['post: start to composer'] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        first = bot.page.wait_for_selector('[data-testid="tweetTextarea_0"]')
+        bot._fill_tweet_safely(first, TWEETS[0])
+        for i in range(1, len(TWEETS)):
+            box = bot._add_tweet_box(i)
+            bot._fill_tweet_safely(box, TWEETS[i])
+        timings['post: compose thread'] = time.perf_counter() - start
+        
+        # Throw the draft away
+        bot.page.goto('about:blank')
+    finally:
+        bot.close()
+    return timings
+
+
+def run_mode(headless, runs):
+    samples = {}
+    for _ in range(runs):
+        for measure in (time_search, time_compose):
+            for name, seconds in measure(headless).items():
+                samples.setdefault(name, []).append(seconds)
+    return {name: statistics.median(values) for name, values in samples.items()}
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    # Always launch our own browsers so both modes are measured the same way
+    os.environ.pop("BROWSER_CDP_URL", None)
+    
+    results = {}
+    for label, headless in (("headed", False), ("headless", True)):
+        print(f"\n=== Running {label} ({runs} runs) ===")
+        try:
+            results[label] = run_mode(headless, runs)
+        except Exception as e:
+            print(f"{label} run failed: {e}")
+            results[label] = {}
+    
+    names = sorted(set(results["headed"]) | set(results["headless"]))
+    print(f"\n{'step':<26}{'headed':>10}{'headless':>10}{'speedup':>10}")
+    for name in names:
+        headed = results["headed"].get(name)
+        headless = results["headless"].get(name)
+        speedup = f"{headed / headless:.2f}x" if headed and headless else "-"
+        print(f"{name:<26}"
+              f"{f'{headed:.2f}s' if headed else 'failed':>10}"
+              f"{f'{headless:.2f}s' if headless else 'failed':>10}"
+              f"{speedup:>10}")
+
+
+if __name__ == "__main__":
+    main()
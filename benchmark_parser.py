@@ -0,0 +1,109 @@
+"""Micro-benchmark and accuracy check for the thread parser
+
+Usage: python benchmark_parser.py [iterations]
+
+Runs the compiled single-pass parser (thread_generator.parse_thread_text) and
+the previous line-by-line parser over a corpus of completion shapes seen from
+the model: plain and decorated markers, long threads, "24/7"-style numbers in
+the text, tweets without image tags and truncated responses. Reports time per
+parse and how many tweets each parser recovered.
+"""
+import statistics
+import sys
+import time
+from thread_generator import parse_thread_text
+
+
+def _thread(count, marker="{i}/{n}", image=True, skip=()):
+    lines = ["Here's your thread:", ""]
+    for i in range(1, count + 1):
+        if i in skip:
+            continue
+        lines.append(f"{marker.format(i=i, n=count)} Tweet number {i} about the topic, "
+                     f"with a few facts and an emoji 🚀")
+        if image:
+            lines.append(f"[IMG: photo for tweet {i}]")
+        lines.append("")
+    return "\n".join(lines)
+
+
+# (name, response, tweets that should be recovered)
+CORPUS = [
+    ("10 tweets", _thread(10), 10),
+    ("25 tweets", _thread(25), 25),
+    ("bold markers", _thread(10, "**{i}/{n}**"), 10),
+    ("'Tweet i/n:' markers", _thread(8, "Tweet {i}/{n}:"), 8),
+    ("spaced markers", _thread(8, "{i} / {n}"), 8),
+    ("24/7 in text", _thread(6).replace("with a few facts", "open 24/7\n24/7 support, with a few facts"), 6),
+    ("no image tags", _thread(7, image=False), 7),
+    ("missing tweet 4", _thread(10, skip=(4,)), 9),
+    # Cut off inside tweet 10's image tag
+    ("truncated", _thread(12)[:_thread(12).index("[IMG: photo for tweet 10]") + 12], 10),
+]
+
+
+def legacy_parse(response):
+    """The line-based parser this one replaced, kept here for comparison"""
+    tweets, image_queries, current = [], [], []
+    expected = None
+
+    def process(lines):
+        text = ' '.join(lines)
+        start = text.find('[IMG:')
+        if start != -1:
+            end = text.find(']', start)
+            tweets.append(text[:start].strip())
+            image_queries.append(text[start + 5:end].strip())
+
+    for line in response.split('\n'):
+        if not line.strip():
+            continue
+        if not expected and '1/' in line:
+            try:
+                expected = int(line.split('/')[1].split()[0])
+            except Exception:
+                expected = 10
+        if any(f"{i}/" in line.strip() for i in range(1, 11)):
+            if current:
+                process(current)
+            current = [line]
+        else:
+            current.append(line)
+    if current:
+        process(current)
+    if expected and len(tweets) < expected:
+        return None
+    return {'tweets': tweets, 'image_queries': image_queries}
+
+
+def time_parser(parse, response, iterations):
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            parse(response)
+        samples.append((time.perf_counter() - start) / iterations)
+    return statistics.median(samples)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    print(f"{'case':<22}{'want':>5}{'new':>5}{'old':>5}{'new µs':>9}{'old µs':>9}")
+    totals = {'new': 0, 'old': 0, 'want': 0}
+    for name, response, want in CORPUS:
+        new = len(parse_thread_text(response)['tweets'])
+        old_result = legacy_parse(response)
+        old = len(old_result['tweets']) if old_result else 0
+        new_time = time_parser(parse_thread_text, response, iterations)
+        old_time = time_parser(legacy_parse, response, iterations)
+        totals['new'] += new
+        totals['old'] += old
+        totals['want'] += want
+        print(f"{name:<22}{want:>5}{new:>5}{old:>5}{new_time * 1e6:>9.1f}{old_time * 1e6:>9.1f}")
+
+    print(f"\nRecovered {totals['new']}/{totals['want']} tweets (old parser: {totals['old']}/{totals['want']})")
+
+
+if __name__ == "__main__":
+    main()
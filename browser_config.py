@@ -0,0 +1,65 @@
+"""Launch and context settings shared by every Playwright entry point
+
+BROWSER_HEADLESS=1 runs without a window (e.g. on Linux workers without a
+display). Headed and headless use the same viewport, user agent, locale and
+timezone so X's compose UI lays out and behaves the same either way.
+"""
+import os
+
+DEFAULT_USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
+)
+
+
+def headless(override=None):
+    """Whether to run headless; an explicit override beats BROWSER_HEADLESS"""
+    if override is not None:
+        return override
+    return os.getenv("BROWSER_HEADLESS", "0") == "1"
+
+
+def viewport():
+    return {
+        'width': int(os.getenv("BROWSER_WIDTH", "1280")),
+        'height': int(os.getenv("BROWSER_HEIGHT", "900"))
+    }
+
+
+def user_agent():
+    # Headless Chrome advertises "HeadlessChrome", which X treats differently
+    return os.getenv("BROWSER_USER_AGENT", DEFAULT_USER_AGENT)
+
+
+def launch_options(headless_override=None):
+    """Keyword arguments for chromium.launch()/launch_persistent_context()"""
+    return {
+        'headless': headless(headless_override),
+        'args': ['--disable-blink-features=AutomationControlled']
+    }
+
+
+def context_options():
+    """Keyword arguments for new_context()/launch_persistent_context()"""
+    return {
+        'viewport': viewport(),
+        'user_agent': user_agent(),
+        'locale': os.getenv("BROWSER_LOCALE", "en-US"),
+        'timezone_id': os.getenv("BROWSER_TIMEZONE", "America/New_York"),
+        'device_scale_factor': 1,
+        'color_scheme': 'light'
+    }
+
+
+def chromium_args(headless_override=None):
+    """The same settings as raw Chromium flags, for browser_service"""
+    size = viewport()
+    args = [
+        f"--window-size={size['width']},{size['height']}",
+        f"--user-agent={user_agent()}",
+        f"--lang={os.getenv('BROWSER_LOCALE', 'en-US')}",
+        '--disable-blink-features=AutomationControlled'
+    ]
+    if headless(headless_override):
+        args.append('--headless=new')
+    return args
@@ -0,0 +1,177 @@
+"""Long-lived Chromium that XAutomation and GoogleImageFinder attach to over CDP
+
+Run ``python browser_service.py`` once (after logging in with login.py) and set
+BROWSER_CDP_URL=http://127.0.0.1:9222 for the bot. Jobs then connect to the
+already warm, logged-in browser instead of cold-starting their own.
+"""
+import os
+import subprocess
+import sys
+import time
+import requests
+from dotenv import load_dotenv
+from playwright.sync_api import sync_playwright
+import browser_config
+
+load_dotenv()
+
+
+def cdp_endpoint():
+    """The configured browser service endpoint, or None"""
+    return os.getenv("BROWSER_CDP_URL") or None
+
+
+def is_healthy(endpoint, timeout=2):
+    """Check that a CDP endpoint answers /json/version"""
+    try:
+        response = requests.get(f"{endpoint.rstrip('/')}/json/version", timeout=timeout)
+        return response.ok and 'webSocketDebuggerUrl' in response.json()
+    except Exception:
+        return False
+
+
+def connect(playwright, endpoint):
+    """Attach to the browser service and return (browser, context)
+    
+    The context is the browser's default one, which carries the logged-in
+    profile. Closing the returned browser only disconnects from the service.
+    """
+    browser = playwright.chromium.connect_over_cdp(endpoint)
+    context = browser.contexts[0] if browser.contexts else browser.new_context()
+    return browser, context
+
+
+def default_max_pages():
+    """Pages the bot's own pools may legitimately keep open, plus room for one-off pages"""
+    if os.getenv("BROWSER_MAX_PAGES"):
+        return int(os.getenv("BROWSER_MAX_PAGES"))
+    posting_pages = int(os.getenv("X_PAGE_POOL_SIZE", "2"))
+    # Warm image pages plus the fresh pages a search wave opens when none are free
+    image_pages = 2 * int(os.getenv("IMAGE_CONCURRENCY", "4"))
+    return posting_pages + image_pages + 4
+
+
+class BrowserService:
+    """Keeps one logged-in Chromium alive with remote debugging enabled"""
+    
+    def __init__(self, user_data_dir="./chrome-data", port=9222, max_pages=None,
+                 check_interval=5, idle_seconds=None):
+        self.user_data_dir = os.path.abspath(user_data_dir)
+        self.port = port
+        self.max_pages = max_pages or default_max_pages()
+        # A page is only reaped after sitting on the same URL this long
+        if idle_seconds is None:
+            idle_seconds = float(os.getenv("BROWSER_REAP_IDLE_SECONDS", "600"))
+        self.idle_seconds = idle_seconds
+        self.check_interval = check_interval
+        self.process = None
+        self.restarts = 0
+        self._page_seen = {}
+    
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.port}"
+    
+    def _executable(self):
+        with sync_playwright() as playwright:
+            return playwright.chromium.executable_path
+    
+    def launch(self, timeout=30):
+        """Start Chromium and wait until its CDP endpoint is healthy"""
+        args = [
+            self._executable(),
+            f"--remote-debugging-port={self.port}",
+            f"--user-data-dir={self.user_data_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            *browser_config.chromium_args(),
+            "https://twitter.com/home"
+        ]
+        self.process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if is_healthy(self.endpoint):
+                print(f"✅ Browser service listening on {self.endpoint}")
+                return
+            if self.process.poll() is not None:
+                break
+            time.sleep(0.5)
+        raise Exception("Browser service failed to start")
+    
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+    
+    def restart(self):
+        print("⚠️ Browser service unhealthy, restarting...")
+        self.stop()
+        self.restarts += 1
+        self.launch()
+    
+    def reap_pages(self):
+        """Close pages leaked by crashed clients once there are too many
+        
+        Only pages that haven't navigated for ``idle_seconds`` are candidates,
+        so pages a client is using (or a pool is cycling) are left alone.
+        """
+        try:
+            targets = requests.get(f"{self.endpoint}/json/list", timeout=2).json()
+        except Exception:
+            return
+        pages = [target for target in targets if target.get('type') == 'page']
+        now = time.monotonic()
+        seen = {}
+        for target in pages:
+            url, since = self._page_seen.get(target['id'], (None, now))
+            seen[target['id']] = (target.get('url'), since if url == target.get('url') else now)
+        self._page_seen = seen
+        
+        excess = len(pages) - self.max_pages
+        if excess <= 0:
+            return
+        # Longest idle first
+        idle = sorted(
+            (target for target in pages if now - seen[target['id']][1] >= self.idle_seconds),
+            key=lambda target: seen[target['id']][1]
+        )
+        for target in idle[:excess]:
+            try:
+                requests.get(f"{self.endpoint}/json/close/{target['id']}", timeout=2)
+                self._page_seen.pop(target['id'], None)
+                print(f"Closed leaked page {target.get('url', '')}")
+            except Exception:
+                pass
+    
+    def serve(self):
+        """Run the browser and restart it whenever a health check fails"""
+        if is_healthy(self.endpoint):
+            print(f"Browser service already running on {self.endpoint}")
+            return
+        
+        self.launch()
+        try:
+            while True:
+                time.sleep(self.check_interval)
+                if self.process.poll() is not None or not is_healthy(self.endpoint):
+                    self.restart()
+                else:
+                    self.reap_pages()
+        except KeyboardInterrupt:
+            print("\nStopping browser service...")
+        finally:
+            self.stop()
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.getenv("BROWSER_CDP_PORT", "9222"))
+    BrowserService(port=port).serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DOWNLOAD_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive'
+}
+
+# Map content types to extensions
+EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp'
+}
+
+
+class DownloadError(Exception):
+    """Raised when a download fails or doesn't look like an image"""
+
+
+def sniff_image_type(data):
+    """Return the image MIME type from the first bytes of a file, or None"""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+class Downloader:
+    """Shared image downloader with pooled keep-alive connections
+    
+    One requests.Session keeps a connection pool per host, so repeated
+    downloads skip DNS, TCP and TLS setup. 429/5xx responses are retried with
+    exponential backoff, parallelism is bounded, bodies over ``max_bytes`` are
+    refused, and anything whose first bytes aren't an image (e.g. an HTML
+    error page) is aborted before the rest is read.
+    """
+    
+    def __init__(self, max_parallel=8, max_bytes=15 * 1024 * 1024, timeout=10,
+                 retries=3, backoff=0.5, chunk_size=64 * 1024):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.metrics = []
+        self._slots = threading.BoundedSemaphore(max_parallel)
+        
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET', 'HEAD'),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=max_parallel,
+            max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.headers.update(DOWNLOAD_HEADERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def head(self, url, timeout=5):
+        """Cheap HEAD request through the shared pool"""
+        return self.session.head(url, timeout=timeout, allow_redirects=True)
+    
+    def download(self, url, on_chunk):
+        """Stream ``url`` to ``on_chunk(bytes)`` and return download metrics
+        
+        The returned dict has the sniffed ``content_type`` and matching ``ext``
+        plus ``bytes``, ``ttfb`` (seconds), ``seconds`` and ``throughput``
+        (bytes/s). Raises DownloadError on failure.
+        """
+        with self._slots:
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, stream=True, timeout=self.timeout)
+            except requests.RequestException as e:
+                raise DownloadError(f"Request failed: {e}") from e
+            
+            with response:
+                if response.status_code >= 400:
+                    raise DownloadError(f"HTTP {response.status_code} for {url}")
+                
+                length = response.headers.get('content-length')
+                if length and length.isdigit() and int(length) > self.max_bytes:
+                    raise DownloadError(f"Image too large ({int(length)} bytes)")
+                
+                content_type = None
+                ttfb = None
+                received = 0
+                head = b''
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if not chunk:
+                        continue
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - start
+                    
+                    received += len(chunk)
+                    if received > self.max_bytes:
+                        raise DownloadError(f"Image larger than {self.max_bytes} bytes")
+                    
+                    if content_type is None:
+                        # Hold chunks back until there's enough to sniff the format
+                        head += chunk
+                        if len(head) < 12:
+                            continue
+                        content_type = sniff_image_type(head)
+                        if content_type is None:
+                            raise DownloadError(f"Not an image response from {url}")
+                        chunk, head = head, b''
+                    
+                    on_chunk(chunk)
+                
+                if content_type is None:
+                    content_type = sniff_image_type(head)
+                    if content_type is None:
+                        raise DownloadError(f"Not an image response from {url}")
+                    on_chunk(head)
+            
+            seconds = time.perf_counter() - start
+            metrics = {
+                'url': url,
+                'content_type': content_type,
+                'ext': EXTENSIONS[content_type],
+                'bytes': received,
+                'ttfb': ttfb or seconds,
+                'seconds': seconds,
+                'throughput': received / seconds if seconds else 0.0
+            }
+            self.metrics.append(metrics)
+            print(f"⬇ {received / 1024:.0f} KB in {seconds:.2f}s "
+                  f"(ttfb {metrics['ttfb'] * 1000:.0f} ms, {metrics['throughput'] / 1024:.0f} KB/s)")
+            return metrics
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def get_downloader():
+    """Return the process-wide Downloader so every caller shares one pool"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Downloader()
+        return _shared
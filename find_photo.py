@@ -2,43 +2,353 @@ from playwright.sync_api import sync_playwright
 import time
 from urllib.parse import quote_plus
 import os
-import requests
-import tempfile
 from urllib.parse import urlparse
 from datetime import datetime
 import re
+import json
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from cache import SQLiteCache
+from media_store import MediaStore
+from image_probe import CandidateRanker, parse_image_header
+from downloader import EXTENSIONS
+import base64
+from urllib.parse import unquote_to_bytes
+import browser_service
+from resource_blocking import install_router
+import browser_config
+
+# Cached candidates re-checked on a hit before the entry is treated as stale
+CACHE_REVALIDATE_CANDIDATES = 3
+
+# Original images appear in Google's embedded result data as ["https://...",height,width]
+ORIGINAL_IMAGE_PATTERN = re.compile(r'\["(https?://(?:[^"\\]|\\.)+)",(\d+),(\d+)\]')
+
+def extract_original_image_urls(html, limit=50):
+    """Pull original image URLs, in result order, out of a results page's embedded data"""
+    urls = []
+    seen = set()
+    for match in ORIGINAL_IMAGE_PATTERN.finditer(html):
+        try:
+            # The data is JSON inside a script, so URLs carry escapes like \u003d
+            url = json.loads(f'"{match.group(1)}"')
+        except ValueError:
+            continue
+        host = urlparse(url).netloc
+        # Skip Google's own thumbnails and assets
+        if host.endswith(('gstatic.com', 'google.com', 'googleusercontent.com')):
+            continue
+        if url in seen:
+            continue
+        seen.add(url)
+        urls.append(url)
+        if len(urls) >= limit:
+            break
+    return urls
+
+def decode_data_uri(uri):
+    """Return the payload bytes of a data: URI, or None if it's malformed"""
+    try:
+        header, payload = uri.split(',', 1)
+        if header.endswith(';base64'):
+            return base64.b64decode(payload)
+        return unquote_to_bytes(payload)
+    except (ValueError, base64.binascii.Error):
+        return None
+
+def _file_identity(path):
+    """Which file is at ``path`` right now, or None if there is none"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def normalize_query(query):
+    """Normalize a search query for caching: case, punctuation and whitespace"""
+    query = re.sub(r'[^\w\s]', ' ', query.lower())
+    return ' '.join(query.split())
 
 class GoogleImageFinder:
-    def __init__(self, browser=None):
+    def __init__(self, browser=None, use_cache=True, media_store=None, harvest=True, rank=True,
+                 page_pool=None, router=None, headless=None):
         self._browser = browser
+        # Warm pages shared across finders (see page_pool.PagePool)
+        self.page_pool = page_pool
+        self._owns_media_store = media_store is None
+        self.media_store = media_store or MediaStore()
+        self._playwright = None
+        self._cdp_browser = None
+        self._launched_browser = None
+        self.headless = browser_config.headless(headless)
+        # Request router of a shared context, used only for reporting
+        self.router = router
         self.page = None
+        # Searches that actually hit Google (cache hits don't count), for throttling
+        self.network_searches = 0
         self._owns_browser = browser is None
+        self.search_cache = None
+        if use_cache:
+            self.search_cache = SQLiteCache(
+                os.getenv("IMAGE_CACHE_PATH", ".cache/image_search.sqlite3"),
+                table="image_search",
+                ttl=float(os.getenv("IMAGE_CACHE_TTL", str(7 * 24 * 3600))),
+                max_entries=int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "2000"))
+            )
+        # Read every result URL from the page data instead of clicking thumbnails
+        self.harvest = harvest
+        # Probe candidates' headers and download only the best fit for X
+        self.ranker = CandidateRanker(self.media_store.downloader) if rank else None
+        # Inline data: images are decoded instead of treated as failures
+        self.accept_data_uris = os.getenv("IMAGE_DATA_URIS", "1") == "1"
+        self.data_uri_min_side = int(os.getenv("IMAGE_DATA_URI_MIN_SIDE", "200"))
+        self.upgrade_data_uris = os.getenv("IMAGE_DATA_URI_UPGRADE", "1") == "1"
+        self._upgrades = ThreadPoolExecutor(max_workers=2)
+        # Queries that found nothing are remembered for a shorter time
+        self.negative_ttl = float(os.getenv("IMAGE_CACHE_NEGATIVE_TTL", "3600"))
         
     def start(self):
-        """Initialize the browser"""
-        if self._owns_browser:
+        """Initialize the browser
+        
+        The page (and, when standalone, the browser) is created lazily on the
+        first search that isn't answered from the cache.
+        """
+        pass
+    
+    def _ensure_page(self):
+        if not self.page:
+            self.page = self._lease_page()
+        return self.page
+    
+    def _lease_page(self, timeout=30):
+        """Take a page from the pool if there is one, otherwise open a new one"""
+        if self.page_pool:
+            return self.page_pool.acquire(timeout)
+        self._ensure_browser()
+        return self._browser.new_page()
+    
+    def _return_page(self, page):
+        try:
+            if self.page_pool:
+                self.page_pool.release(page)
+            else:
+                page.close()
+        except Exception:
+            pass
+    
+    def _ensure_browser(self):
+        if self._owns_browser and not self._browser:
             self._playwright = sync_playwright().start()
-            self._browser = self._playwright.chromium.launch(headless=False)
-        self.page = self._browser.new_page()
+            endpoint = browser_service.cdp_endpoint()
+            if endpoint and browser_service.is_healthy(endpoint):
+                # Borrow pages from the shared browser's context
+                self._cdp_browser, self._browser = browser_service.connect(self._playwright, endpoint)
+            else:
+                # One context for all our pages so request routing covers them
+                self._launched_browser = self._playwright.chromium.launch(
+                    **browser_config.launch_options(self.headless)
+                )
+                self._browser = self._launched_browser.new_context(**browser_config.context_options())
+            self.router = install_router(self._browser)
         
     def close(self):
         """Clean up resources"""
+        # Let in-flight image upgrades land before the files are used
+        self._upgrades.shutdown(wait=True)
         if self.page:
-            self.page.close()
+            self._return_page(self.page)
+            self.page = None
         # Only close browser if we created it
         if self._owns_browser:
-            if self._browser:
-                self._browser.close()
+            if self._cdp_browser:
+                # Only disconnect; the browser service keeps running
+                self._cdp_browser.close()
+                self._cdp_browser = None
+            elif self._launched_browser:
+                self._launched_browser.close()
+                self._launched_browser = None
+            self._browser = None
             if self._playwright:
                 self._playwright.stop()
+                self._playwright = None
+        if self.search_cache:
+            self.search_cache.close()
+            self.search_cache = None
+        if self._owns_media_store and self.media_store:
+            self.media_store.close()
+            self.media_store = None
+    
+    def _cached_candidates(self, query):
+        """Return (hit, candidates) for a query from the search cache
+        
+        A hit with no candidates is a remembered empty search. The first few
+        cached candidates are re-validated with cheap requests in parallel and
+        stale ones at the front are dropped; if none of them still works the
+        entry is evicted and the lookup counts as a miss.
+        """
+        if not self.search_cache:
+            return False, []
+        candidates = self.search_cache.get(normalize_query(query))
+        if candidates is None:
+            return False, []
+        if not candidates:
+            print(f"Cached: no images for '{query}'")
+            return True, []
+        checked = candidates[:CACHE_REVALIDATE_CANDIDATES]
+        with ThreadPoolExecutor(max_workers=len(checked)) as executor:
+            reachable = list(executor.map(self._is_reachable, checked))
+        for i, ok in enumerate(reachable):
+            if ok:
+                print(f"Cached image for '{query}'")
+                return True, candidates[i:]
+        # A fresh search is cheaper than probing a long list of dead links
+        self.search_cache.delete(normalize_query(query))
+        return False, []
+    
+    def _remember(self, query, candidates):
+        """Store candidate URLs for a query (an empty list caches a miss)"""
+        if not self.search_cache:
+            return
+        ttl = None if candidates else self.negative_ttl
+        self.search_cache.set(normalize_query(query), candidates, ttl=ttl)
+    
+    def _is_reachable(self, url):
+        """Cheaply check that a URL still serves an image"""
+        if url.startswith('data:'):
+            return True
+        try:
+            downloader = self.media_store.downloader
+            response = downloader.head(url)
+            if response.status_code in (403, 405):
+                # Some hosts refuse HEAD; fall back to a GET we don't read
+                response = downloader.session.get(url, timeout=5, stream=True)
+                response.close()
+            if response.status_code >= 400:
+                return False
+            content_type = response.headers.get('content-type', '')
+            return not content_type or content_type.startswith('image/')
+        except Exception:
+            return False
             
     def search_image(self, query):
         """Search for an image and return its URL"""
+        return self._pick(self.search_image_candidates(query))
+    
+    def _pick(self, candidates):
+        """Choose the candidate to download, probing and ranking them if enabled"""
+        if not candidates:
+            return None
+        if self.ranker:
+            return self.ranker.best(candidates)
+        return candidates[0]
+    
+    def _download_best(self, candidates, filename_base, output_dir, query=None):
+        url = self._pick(candidates)
+        if not url:
+            return None
+        
+        filepath = self.download_single_image(url, filename_base, output_dir)
+        if filepath and url.startswith('data:') and self.upgrade_data_uris:
+            alternatives = [c for c in candidates if not c.startswith('data:')]
+            self._upgrades.submit(self._upgrade_image, filepath, alternatives, query, _file_identity(filepath))
+        return filepath
+    
+    def download_best_image(self, query, filename_base, output_dir):
+        """Search for ``query`` and download the best candidate into ``output_dir``"""
+        return self._download_best(
+            self.search_image_candidates(query), filename_base, output_dir, query
+        )
+    
+    def _save_data_uri(self, uri, filename_base, output_dir):
+        """Decode an inline data: URI straight into the media store"""
+        if not self.accept_data_uris:
+            print("Skipping inline data: image")
+            return None
+        decoded = decode_data_uri(uri)
+        if not decoded:
+            print("Could not decode data: URI")
+            return None
+        
+        mime, width, height = parse_image_header(decoded)
+        if not mime:
+            print("data: URI doesn't contain a supported image")
+            return None
+        if width and height and min(width, height) < self.data_uri_min_side:
+            print(f"Inline image too small ({width}x{height}), skipping")
+            return None
+        
+        stored = self.media_store.put_bytes(decoded, EXTENSIONS[mime])
+        print(f"Decoded inline {mime} image ({width}x{height})")
+        return self.media_store.link(stored, output_dir, filename_base)
+    
+    def _upgrade_image(self, filepath, candidates, query=None, identity=None):
+        """Background: swap a decoded inline image for a sharper download
+        
+        Uses the remaining candidates, or a browserless fetch of the results
+        page when there are none. Only same-format replacements are made so
+        the file keeps its name and extension. Nothing is replaced if the file
+        no longer matches ``identity``, e.g. because the user picked another image.
+        """
         try:
-            encoded_query = quote_plus(query)
-            url = f"https://www.google.com/search?q={encoded_query}&tbm=isch"
+            if not candidates and query:
+                candidates = self._fetch_result_urls(query)
+            if not candidates or not self.ranker:
+                return
+            if identity and _file_identity(filepath) != identity:
+                return
+            
+            with open(filepath, 'rb') as f:
+                mime, width, height = parse_image_header(f.read(64 * 1024))
+            current = (width or 0) * (height or 0)
             
-            self.page.goto(url, wait_until='networkidle')
+            for probe in self.ranker.rank(candidates):
+                if probe['mime'] != mime or (probe['width'] or 0) * (probe['height'] or 0) <= current:
+                    continue
+                stored = self.media_store.fetch(probe['url'])
+                if stored and identity and _file_identity(filepath) != identity:
+                    print(f"Skipping upgrade of {os.path.basename(filepath)}: it was replaced meanwhile")
+                    return
+                if stored:
+                    base = os.path.splitext(os.path.basename(filepath))[0]
+                    self.media_store.link(stored, os.path.dirname(filepath), base)
+                    print(f"Upgraded {base} to {probe['width']}x{probe['height']}")
+                    return
+        except Exception as e:
+            print(f"Background image upgrade failed: {e}")
+    
+    def _fetch_result_urls(self, query):
+        """Browserless search: read candidate URLs from the plain results page"""
+        response = self.media_store.downloader.session.get(self._search_url(query), timeout=10)
+        return extract_original_image_urls(response.text) if response.ok else []
+    
+    def wait_for_upgrades(self):
+        """Wait for background image upgrades started so far"""
+        self._upgrades.shutdown(wait=True)
+        self._upgrades = ThreadPoolExecutor(max_workers=2)
+    
+    def search_image_candidates(self, query):
+        """Search for an image and return candidate URLs, best first"""
+        hit, candidates = self._cached_candidates(query)
+        if hit:
+            return candidates
+        
+        try:
+            self._ensure_page()
+            self.network_searches += 1
+            if self.harvest:
+                response = self.page.goto(self._search_url(query), wait_until='domcontentloaded')
+                self._report_navigation(query)
+                candidates = self._harvest(response)
+                if candidates:
+                    print(f"Harvested {len(candidates)} image candidates")
+                    self._remember(query, candidates)
+                    return candidates
+                print("No embedded image data found, falling back to clicking thumbnails")
+            else:
+                self.page.goto(self._search_url(query), wait_until='domcontentloaded')
+                self._report_navigation(query)
+            
+            # The results page is already open either way; click through it
             self.page.wait_for_selector('.H8Rx8c', timeout=10000)
             
             def try_get_image(image_element):
@@ -61,132 +371,272 @@ class GoogleImageFinder:
                     
                     if image_url:
                         print(f"Successfully found image {i+1}")
-                        return image_url
+                        self._remember(query, [image_url])
+                        return [image_url]
                 except Exception as e:
                     print(f"Failed to get image {i+1}: {e}")
                     continue
             
             print("All 5 image attempts failed")
-            return None
+            self._remember(query, [])
+            return []
             
         except Exception as e:
             print(f"Error searching for image: {e}")
-            return None
+            return []
+    
+    def _report_navigation(self, label):
+        if self.router:
+            self.router.report(f"Search '{label}'")
+    
+    def _harvest(self, response):
+        """Extract candidate URLs from a results page navigation response"""
+        if response is None or not response.ok:
+            return []
+        try:
+            return extract_original_image_urls(response.text())
+        except Exception as e:
+            print(f"Error reading results page: {e}")
+            return []
+
+    def _search_url(self, query):
+        return f"https://www.google.com/search?q={quote_plus(query)}&tbm=isch"
+
+    def search_images(self, queries, max_concurrency=4, query_timeout=30, on_found=None):
+        """Search for several queries at once using a bounded pool of pages.
+        
+        Queries are handled in waves of ``max_concurrency`` pages: every page in
+        a wave starts navigating before any of them is waited on, and thumbnail
+        clicks are interleaved across pages so the 2 second settle time is paid
+        once per attempt for the whole wave instead of once per query.
+        
+        Returns a list of candidate URL lists aligned with ``queries`` (empty
+        where nothing was found, the query timed out, or the query itself was
+        None). If given, ``on_found(index, candidates)`` is called as soon as
+        each query's candidates are known.
+        """
+        results = [[] for _ in queries]
+        pending = []
+        for i, query in enumerate(queries):
+            if not query:
+                continue
+            hit, candidates = self._cached_candidates(query)
+            if not hit:
+                pending.append(i)
+            elif candidates:
+                results[i] = candidates
+                if on_found:
+                    on_found(i, candidates)
+        if not pending:
+            return results
+        
+        wanted = min(max(1, max_concurrency), len(pending))
+        pages = []
+        pooled = False
+        try:
+            # Take whatever warm pages are free right now; never wait on our own leases
+            while self.page_pool and len(pages) < wanted:
+                try:
+                    pages.append(self.page_pool.acquire(timeout=0))
+                except TimeoutError:
+                    break
+            pooled = bool(pages)
+            if not pooled:
+                self._ensure_browser()
+                pages = [self._browser.new_page() for _ in range(wanted)]
+            
+            for start in range(0, len(pending), len(pages)):
+                wave = pending[start:start + len(pages)]
+                self._search_wave(
+                    [(i, queries[i], pages[n]) for n, i in enumerate(wave)],
+                    results,
+                    query_timeout,
+                    on_found
+                )
+        finally:
+            for page in pages:
+                if pooled:
+                    self.page_pool.release(page)
+                else:
+                    page.close()
+        
+        return results
 
-    def download_images_for_thread(self, queries, thread_id=None, output_dir="thread_images"):
+    def _search_wave(self, jobs, results, query_timeout, on_found=None):
+        """Run one wave of (index, query, page) searches, filling ``results``"""
+        timeout_ms = query_timeout * 1000
+        deadlines = {}
+        active = {}
+        responses = {}
+        harvested = {}
+        
+        # Kick off every navigation first so the page loads overlap
+        for index, query, page in jobs:
+            print(f"Searching for image {index+1}: {query}")
+            deadlines[index] = time.monotonic() + query_timeout
+            try:
+                responses[index] = page.goto(self._search_url(query), wait_until='commit', timeout=timeout_ms)
+                active[index] = page
+            except Exception as e:
+                print(f"✗ Search navigation failed for tweet {index+1}: {e}")
+        
+        if self.harvest:
+            for index in list(active):
+                candidates = self._harvest(responses[index])
+                if candidates:
+                    print(f"Harvested {len(candidates)} image candidates for tweet {index+1}")
+                    harvested[index] = candidates
+                    results[index] = candidates
+                    del active[index]
+                    if on_found:
+                        on_found(index, candidates)
+        
+        for index, page in list(active.items()):
+            remaining = deadlines[index] - time.monotonic()
+            try:
+                page.wait_for_selector('.H8Rx8c', timeout=max(remaining, 0.1) * 1000)
+            except Exception as e:
+                print(f"✗ No results loaded for tweet {index+1}: {e}")
+                del active[index]
+        
+        # Try first 5 images, one attempt per page per round
+        for attempt in range(5):
+            clicked = []
+            for index, page in active.items():
+                if time.monotonic() >= deadlines[index]:
+                    continue
+                try:
+                    page.locator('.H8Rx8c img').nth(attempt).click(timeout=5000)
+                    clicked.append(index)
+                except Exception as e:
+                    print(f"Failed to click image {attempt+1} for tweet {index+1}: {e}")
+            
+            if not clicked:
+                break
+            
+            time.sleep(2)
+            
+            for index in clicked:
+                try:
+                    full_image = active[index].locator('img[class*="iPVvYb"]').first
+                    image_url = full_image.get_attribute('src', timeout=5000)
+                except Exception as e:
+                    print(f"Error getting full image URL for tweet {index+1}: {e}")
+                    continue
+                if image_url:
+                    print(f"Found image {attempt+1} for tweet {index+1}")
+                    results[index] = [image_url]
+                    del active[index]
+                    if on_found:
+                        on_found(index, results[index])
+        
+        for index in active:
+            print(f"✗ All image attempts failed for tweet {index+1}")
+        
+        self._report_navigation(f"{len(jobs)} queries")
+        
+        # Only cache searches that actually completed; timeouts may be transient
+        for index, query, _ in jobs:
+            if index in harvested:
+                self._remember(query, harvested[index])
+            elif results[index]:
+                self._remember(query, results[index])
+            elif index in active and time.monotonic() < deadlines[index]:
+                self._remember(query, [])
+
+    def fetch_images(self, queries, output_dir, max_concurrency=4, query_timeout=30):
+        """Search and download images for ``queries`` concurrently.
+        
+        Downloads start as soon as a search yields candidates, so they overlap
+        with the remaining searches; each one probes and ranks its candidates
+        first and downloads only the winner. Files are written to ``output_dir`` as
+        ``tweet_{i}{ext}`` and the returned list is aligned with ``queries``,
+        holding None for queries that were skipped (None) or failed.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        local_paths = [None] * len(queries)
+        futures = {}
+        executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency))
+        
+        def start_download(index, candidates):
+            futures[index] = executor.submit(
+                self._download_best, candidates, f"tweet_{index}", output_dir, queries[index]
+            )
+        
+        try:
+            self.search_images(queries, max_concurrency, query_timeout, on_found=start_download)
+            
+            deadline = time.monotonic() + query_timeout
+            for i, query in enumerate(queries):
+                if not query:
+                    continue
+                if i not in futures:
+                    print(f"✗ No valid image URL found for tweet {i+1}")
+                    continue
+                try:
+                    local_paths[i] = futures[i].result(timeout=max(deadline - time.monotonic(), 0))
+                except FutureTimeoutError:
+                    print(f"✗ Timed out downloading image {i+1}")
+                    continue
+                except Exception as e:
+                    print(f"✗ Failed to download image {i+1}: {e}")
+                    continue
+                if local_paths[i]:
+                    print(f"✓ Downloaded image {i+1}")
+                else:
+                    print(f"✗ Failed to download image {i+1}")
+        finally:
+            # Don't let a stuck download hold up the thread past its timeout
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return local_paths
+
+    def download_images_for_thread(self, queries, thread_id=None, output_dir="thread_images",
+                                   max_concurrency=1, query_timeout=30):
         thread_id = thread_id or datetime.now().strftime("%Y%m%d_%H%M%S")
         thread_dir = os.path.join(output_dir, f"thread_{thread_id}")
         os.makedirs(thread_dir, exist_ok=True)
         
+        if max_concurrency > 1:
+            local_paths = self.fetch_images(queries, thread_dir, max_concurrency, query_timeout)
+            return [path for path in local_paths if path is not None]
+        
         local_paths = [None] * len(queries)  # Initialize with None placeholders
         
         for i, query in enumerate(queries):
             print(f"Searching for image {i+1}/{len(queries)}: {query}")
-            url = self.search_image(query)
-            
-            if url and not url.startswith('data:'):
-                ext = '.jpg'
-                if url.lower().endswith(('.png', '.gif', '.webp')):
-                    ext = os.path.splitext(url)[1]
-                filename = f"tweet_{i}{ext}"
-                filepath = os.path.join(thread_dir, filename)
-                
-                downloaded_path = self._download_image(url)
-                if downloaded_path:
-                    os.replace(downloaded_path, filepath)
-                    local_paths[i] = filepath
-                    print(f"✓ Downloaded image {i+1}")
-                else:
-                    print(f"✗ Failed to download image {i+1}")
+            searches = self.network_searches
+            filepath = self.download_best_image(query, f"tweet_{i}", thread_dir)
+            
+            if filepath:
+                local_paths[i] = filepath
+                print(f"✓ Downloaded image {i+1}")
             else:
-                print(f"✗ No valid image URL found for tweet {i+1}")
+                print(f"✗ No valid image found for tweet {i+1}")
             
-            time.sleep(2)
+            # Only throttle after a real search; cached answers don't touch Google
+            if self.network_searches > searches:
+                time.sleep(2)
         
         # Remove None values while maintaining order
         return [path for path in local_paths if path is not None]
 
-    def _download_image(self, url):
-        """Download image from URL to a temporary file with proper headers."""
-        try:
-            # Set up headers to mimic a browser request
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive'
-            }
-            
-            # Make request with headers and timeout
-            response = requests.get(
-                url, 
-                headers=headers, 
-                stream=True, 
-                timeout=10,
-                verify=True
-            )
-            response.raise_for_status()
-            
-            # Map content types to extensions
-            extensions = {
-                'image/jpeg': '.jpg',
-                'image/png': '.png',
-                'image/gif': '.gif',
-                'image/webp': '.webp'
-            }
-            content_type = response.headers.get('content-type', '').lower()
-            ext = extensions.get(content_type, '.jpg')
-            
-            # Create temporary file
-            temp_file = tempfile.NamedTemporaryFile(suffix=ext, delete=False)
-            
-            # Download in chunks
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    temp_file.write(chunk)
-            temp_file.close()
-            
-            return temp_file.name
-            
-        except Exception as e:
-            print(f"Error downloading image: {e}")
-            return None
-
     def download_single_image(self, url, filename_base, output_dir="thread_images"):
-        """Download a single image from a direct URL"""
+        """Download a single image from a direct URL (or decode a data: URI)"""
         try:
-            # Create output directory if it doesn't exist
-            os.makedirs(output_dir, exist_ok=True)
+            if url.startswith('data:'):
+                return self._save_data_uri(url, filename_base, output_dir)
             
-            # Download image to temporary file
-            downloaded_path = self._download_image(url)
-            if not downloaded_path:
+            filepath = self.media_store.save(url, output_dir, filename_base)
+            if not filepath:
                 print("Failed to download image from URL")
                 return None
             
-            # Get extension from downloaded file
-            ext = os.path.splitext(downloaded_path)[1] or '.jpg'
-            
-            # Create final filename and path
-            filename = f"{filename_base}{ext}"
-            filepath = os.path.join(output_dir, filename)
-            
-            # Move file to final location
-            try:
-                os.replace(downloaded_path, filepath)
-                
-                # Verify file exists and has content
-                if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
-                    return filepath
-                else:
-                    print("File verification failed after download")
-                    return None
-                
-            except Exception as e:
-                print(f"Error moving downloaded file: {e}")
-                # Clean up temporary file if move failed
-                if os.path.exists(downloaded_path):
-                    os.unlink(downloaded_path)
+            # Verify file exists and has content
+            if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
+                return filepath
+            else:
+                print("File verification failed after download")
                 return None
             
         except Exception as e:
@@ -215,7 +665,7 @@ def main():
                 ]
                 
                 # Download images and get local paths
-                local_paths = finder.download_images_for_thread(queries)
+                local_paths = finder.download_images_for_thread(queries, max_concurrency=len(queries))
                 print("\nDownloaded images:")
                 for i, path in enumerate(local_paths, 1):
                     print(f"{i}. {path}")
@@ -0,0 +1,169 @@
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from downloader import get_downloader, sniff_image_type
+
+# X's upload limits for images
+X_MAX_BYTES = 5 * 1024 * 1024
+X_MAX_GIF_BYTES = 15 * 1024 * 1024
+X_MIN_SIDE = 4
+X_MAX_SIDE = 8192
+# Aspect ratios X shows without heavy cropping in the timeline
+X_MIN_ASPECT = 9 / 16
+X_MAX_ASPECT = 16 / 9
+# Below this short side an image looks blurry in the timeline
+PREFERRED_MIN_SIDE = 600
+
+
+def parse_image_header(data):
+    """Return (mime, width, height) from the first bytes of an image
+    
+    Width and height are None when the header isn't complete yet or the
+    format isn't recognised.
+    """
+    mime = sniff_image_type(data)
+    try:
+        if mime == 'image/png' and len(data) >= 24:
+            width, height = struct.unpack('>II', data[16:24])
+            return mime, width, height
+        if mime == 'image/gif' and len(data) >= 10:
+            width, height = struct.unpack('<HH', data[6:10])
+            return mime, width, height
+        if mime == 'image/webp' and len(data) >= 30:
+            chunk = data[12:16]
+            if chunk == b'VP8 ':
+                width, height = struct.unpack('<HH', data[26:30])
+                return mime, width & 0x3fff, height & 0x3fff
+            if chunk == b'VP8L':
+                bits = int.from_bytes(data[21:25], 'little')
+                return mime, (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+            if chunk == b'VP8X':
+                width = int.from_bytes(data[24:27], 'little') + 1
+                height = int.from_bytes(data[27:30], 'little') + 1
+                return mime, width, height
+        if mime == 'image/jpeg':
+            return (mime,) + _jpeg_size(data)
+    except struct.error:
+        pass
+    return mime, None, None
+
+
+def _jpeg_size(data):
+    """Walk JPEG segments up to the first start-of-frame marker"""
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        # SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None, None
+
+
+def probe_image(url, downloader=None, max_header_bytes=64 * 1024, timeout=5):
+    """Read just enough of an image to learn its type, size and dimensions"""
+    downloader = downloader or get_downloader()
+    result = {'url': url, 'mime': None, 'width': None, 'height': None, 'bytes': None}
+    try:
+        response = downloader.session.get(
+            url,
+            headers={'Range': f'bytes=0-{max_header_bytes - 1}'},
+            stream=True,
+            timeout=timeout
+        )
+        with response:
+            if response.status_code >= 400:
+                result['error'] = f"HTTP {response.status_code}"
+                return result
+            
+            # Content-Range carries the full size for partial responses
+            content_range = response.headers.get('content-range', '')
+            total = content_range.rsplit('/', 1)[-1] if '/' in content_range else None
+            if total and total.isdigit():
+                result['bytes'] = int(total)
+            elif response.status_code == 200 and response.headers.get('content-length', '').isdigit():
+                result['bytes'] = int(response.headers['content-length'])
+            
+            data = b''
+            for chunk in response.iter_content(chunk_size=4096):
+                data += chunk
+                mime, width, height = parse_image_header(data)
+                if width or len(data) >= max_header_bytes or (len(data) >= 12 and not mime):
+                    break
+            
+            result['mime'], result['width'], result['height'] = parse_image_header(data)
+            if not result['mime']:
+                result['error'] = "Not an image"
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def score_probe(probe):
+    """Score a probe against X's upload constraints (None means unusable)"""
+    mime, width, height, size = probe['mime'], probe['width'], probe['height'], probe['bytes']
+    if not mime or probe.get('error'):
+        return None
+    max_bytes = X_MAX_GIF_BYTES if mime == 'image/gif' else X_MAX_BYTES
+    if size is not None and size > max_bytes:
+        return None
+    if not width or not height:
+        # Readable but unsized: usable, just ranked below anything measured
+        return 0.1
+    if min(width, height) < X_MIN_SIDE or max(width, height) > X_MAX_SIDE:
+        return None
+    
+    resolution = min(min(width, height), PREFERRED_MIN_SIDE * 2) / (PREFERRED_MIN_SIDE * 2)
+    aspect = width / height
+    if X_MIN_ASPECT <= aspect <= X_MAX_ASPECT:
+        fit = 1.0
+    else:
+        # Penalise by how far outside the band the image sits
+        fit = min(aspect / X_MAX_ASPECT, X_MIN_ASPECT / aspect, 1.0) if aspect else 0.0
+    return 0.2 + 0.6 * resolution + 0.2 * fit
+
+
+class CandidateRanker:
+    """Probes candidate image URLs in parallel and ranks them for X"""
+    
+    def __init__(self, downloader=None, max_workers=8, probe_limit=12, timeout=5):
+        self.downloader = downloader or get_downloader()
+        self.max_workers = max_workers
+        self.probe_limit = probe_limit
+        self.timeout = timeout
+    
+    def rank(self, urls):
+        """Return usable probes for the first ``probe_limit`` URLs, best first"""
+        urls = [url for url in urls if not url.startswith('data:')][:self.probe_limit]
+        if not urls:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+            probes = list(executor.map(
+                lambda url: probe_image(url, self.downloader, timeout=self.timeout), urls
+            ))
+        
+        ranked = []
+        for position, probe in enumerate(probes):
+            probe['score'] = score_probe(probe)
+            if probe['score'] is not None:
+                ranked.append((probe['score'], -position, probe))
+        ranked.sort(key=lambda item: item[:2], reverse=True)
+        return [probe for _, _, probe in ranked]
+    
+    def best(self, urls):
+        """Return the best URL, falling back to the first candidate if none probe"""
+        ranked = self.rank(urls)
+        if ranked:
+            winner = ranked[0]
+            print(f"Best of {len(urls)} candidates: {winner['width']}x{winner['height']} "
+                  f"{winner['mime']} ({winner['bytes'] or '?'} bytes)")
+            return winner['url']
+        return urls[0] if urls else None
@@ -0,0 +1,336 @@
+"""Durable queue of saved thread folders to post, drained by worker processes.
+
+A job is ``queued`` until a worker leases it. A leased job is either acked
+(``done``) or failed. Failed jobs go back to ``queued`` with exponential
+backoff until they run out of attempts, then become ``dead``. A lease that is
+not acked or renewed in time (e.g. the worker crashed) expires and the job can
+be leased again.
+
+    python job_queue.py enqueue thread_20250130_154145 [...]
+    python job_queue.py worker [--processes N] [--once]
+    python job_queue.py stats
+    python job_queue.py list [state]
+    python job_queue.py retry <job_id> [--force]
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+DEAD = 'dead'
+
+
+class JobQueue:
+    """SQLite-backed job queue; safe to share between threads and processes"""
+
+    def __init__(self, path=None, lease_seconds=None, max_attempts=None, backoff=None):
+        path = path or os.getenv("JOB_QUEUE_PATH", ".cache/jobs.sqlite3")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.lease_seconds = lease_seconds or int(os.getenv("JOB_LEASE_SECONDS", "900"))
+        self.max_attempts = max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+        self.backoff = backoff or int(os.getenv("JOB_RETRY_BACKOFF", "60"))
+        self._lock = threading.Lock()
+        # Autocommit; lease() opens its own write transaction
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, folder TEXT NOT NULL, "
+            "state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "available_at REAL NOT NULL, leased_at REAL, leased_until REAL, worker TEXT, "
+            "last_error TEXT, created REAL NOT NULL, finished REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, available_at)"
+        )
+
+    def enqueue(self, folder, delay=0):
+        """Add a thread folder (name under threads/) and return its job id"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (folder, state, available_at, created) VALUES (?, ?, ?, ?)",
+                (folder, QUEUED, now + delay, now)
+            )
+            return cursor.lastrowid
+
+    def lease(self, worker):
+        """Claim the next ready job for ``worker``; returns it as a dict or None"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired leases of jobs that already used every attempt are given up on
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, finished = ?, last_error = 'lease expired' "
+                    "WHERE state = ? AND leased_until < ? AND attempts >= ?",
+                    (DEAD, now, LEASED, now, self.max_attempts)
+                )
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE (state = ? AND available_at <= ?) "
+                    "OR (state = ? AND leased_until < ?) ORDER BY available_at, id LIMIT 1",
+                    (QUEUED, now, LEASED, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, attempts = attempts + 1, leased_at = ?, "
+                    "leased_until = ?, worker = ? WHERE id = ?",
+                    (LEASED, now, now + self.lease_seconds, worker, row['id'])
+                )
+                job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+                self._conn.execute("COMMIT")
+                return dict(job)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def heartbeat(self, job_id, worker):
+        """Extend a lease that is still held by ``worker``; False if it was lost"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET leased_until = ? WHERE id = ? AND state = ? AND worker = ?",
+                (time.time() + self.lease_seconds, job_id, LEASED, worker)
+            )
+            return cursor.rowcount == 1
+
+    def ack(self, job_id, worker):
+        """Mark a job leased by ``worker`` done; False if the lease was lost"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, finished = ?, leased_until = NULL "
+                "WHERE id = ? AND state = ? AND worker = ?",
+                (DONE, time.time(), job_id, LEASED, worker)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id, worker, error):
+        """Requeue a failed job with exponential backoff, or dead-letter it
+        
+        Returns the new state, or None if ``worker`` no longer holds the lease.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts FROM jobs WHERE id = ? AND state = ? AND worker = ?",
+                (job_id, LEASED, worker)
+            ).fetchone()
+            if row is None:
+                return None
+            if row['attempts'] >= self.max_attempts:
+                state, column, value = DEAD, 'finished', now
+            else:
+                state, column, value = QUEUED, 'available_at', now + self.backoff * 2 ** (row['attempts'] - 1)
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET state = ?, {column} = ?, leased_until = NULL, last_error = ? "
+                "WHERE id = ? AND state = ? AND worker = ?",
+                (state, value, str(error), job_id, LEASED, worker)
+            )
+            return state if cursor.rowcount == 1 else None
+
+    def retry(self, job_id, force=False):
+        """Put a dead job back in the queue with fresh attempts (done jobs too with force)"""
+        states = (DEAD, DONE) if force else (DEAD,)
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, available_at = ?, finished = NULL "
+                f"WHERE id = ? AND state IN ({', '.join('?' * len(states))})",
+                (QUEUED, time.time(), job_id, *states)
+            )
+            return cursor.rowcount == 1
+
+    def jobs(self, state=None, limit=50):
+        with self._lock:
+            if state:
+                rows = self._conn.execute(
+                    "SELECT * FROM jobs WHERE state = ? ORDER BY id DESC LIMIT ?", (state, limit)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self, window=3600):
+        """Queue depth per state, oldest waiting job and throughput over ``window`` seconds"""
+        now = time.time()
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+            ).fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(created) FROM jobs WHERE state = ?", (QUEUED,)
+            ).fetchone()[0]
+            done, avg_seconds = self._conn.execute(
+                "SELECT COUNT(*), AVG(finished - leased_at) FROM jobs WHERE state = ? AND finished >= ?",
+                (DONE, now - window)
+            ).fetchone()
+            expired = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = ? AND leased_until < ?", (LEASED, now)
+            ).fetchone()[0]
+        return {
+            'queued': counts.get(QUEUED, 0),
+            'leased': counts.get(LEASED, 0),
+            'expired_leases': expired,
+            'done': counts.get(DONE, 0),
+            'dead': counts.get(DEAD, 0),
+            'oldest_queued_seconds': round(now - oldest) if oldest else 0,
+            'done_last_window': done,
+            'throughput_per_hour': round(done * 3600 / window, 1),
+            'avg_post_seconds': round(avg_seconds, 1) if avg_seconds else None
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _keep_lease(queue, job_id, worker, stop):
+    """Renew the lease while a long post is running"""
+    while not stop.wait(queue.lease_seconds / 3):
+        if not queue.heartbeat(job_id, worker):
+            print(f"⚠️ Lost the lease on job {job_id}")
+            return
+
+
+def run_worker(worker=None, poll_interval=5, once=False):
+    """Lease jobs and post them with XAutomation until the queue is empty (once) or forever"""
+    # Imported here so the CLI can inspect the queue without pulling in Playwright
+    from thread_manager import ThreadManager
+
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    queue = JobQueue()
+    manager = ThreadManager()
+    # Keep the browser warm between jobs
+    manager.x_bot.keep_browser = True
+    print(f"👷 Worker {worker} started")
+
+    try:
+        while True:
+            job = queue.lease(worker)
+            if job is None:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            print(f"\n📤 Job {job['id']}: posting {job['folder']} (attempt {job['attempts']})")
+            stop = threading.Event()
+            keeper = threading.Thread(
+                target=_keep_lease, args=(queue, job['id'], worker, stop), daemon=True
+            )
+            keeper.start()
+            try:
+                thread_data, image_files = manager.load_existing_thread(job['folder'])
+                manager.x_bot.start()
+                try:
+                    # Retries continue from the thread folder's progress.json
+                    posted = manager.x_bot.post_thread(
+                        tweets=thread_data['tweets'],
+                        image_paths=image_files,
+                        thread_dir=thread_data['thread_dir']
+                    )
+                finally:
+                    manager.x_bot.close()
+                if queue.ack(job['id'], worker):
+                    print(f"✓ Job {job['id']} done: {posted['thread_url']}")
+                else:
+                    print(f"⚠️ Job {job['id']} posted ({posted['thread_url']}) but its lease was lost; "
+                          f"another worker will resume it from progress.json")
+            except Exception as e:
+                state = queue.fail(job['id'], worker, e)
+                if state:
+                    print(f"✗ Job {job['id']} failed ({e}), now {state}")
+                else:
+                    print(f"✗ Job {job['id']} failed ({e}); its lease was already lost")
+                if isinstance(e, FileNotFoundError):
+                    continue
+                # The browser may be in a bad state after a failed post
+                manager.x_bot.shutdown()
+            finally:
+                stop.set()
+                keeper.join()
+    finally:
+        manager.close()
+        queue.close()
+
+
+def print_stats(queue):
+    stats = queue.stats()
+    print("\n=== Job queue ===")
+    for key, value in stats.items():
+        print(f"{key:<24}{value}")
+    print("=================\n")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durable queue of thread folders to post")
+    commands = parser.add_subparsers(dest='command', required=True)
+    enqueue = commands.add_parser('enqueue', help="Queue thread folders for posting")
+    enqueue.add_argument('folders', nargs='+')
+    worker = commands.add_parser('worker', help="Drain the queue")
+    worker.add_argument('--processes', type=int, default=1)
+    worker.add_argument('--once', action='store_true', help="Exit when the queue is empty")
+    worker.add_argument('--poll-interval', type=float, default=5)
+    commands.add_parser('stats', help="Show queue depth and throughput")
+    listing = commands.add_parser('list', help="List recent jobs")
+    listing.add_argument('state', nargs='?', choices=[QUEUED, LEASED, DONE, DEAD])
+    retry = commands.add_parser('retry', help="Requeue a dead job")
+    retry.add_argument('job_id', type=int)
+    retry.add_argument('--force', action='store_true', help="Also requeue a job that already finished (posts it again)")
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        processes = args.processes
+        if processes > 1 and not os.getenv("BROWSER_CDP_URL"):
+            # Separate Chromiums can't open the same profile directory at once
+            print("Several workers need a shared browser service (BROWSER_CDP_URL); running one")
+            processes = 1
+        if processes == 1:
+            run_worker(poll_interval=args.poll_interval, once=args.once)
+            return
+        workers = [
+            multiprocessing.Process(
+                target=run_worker, kwargs={'poll_interval': args.poll_interval, 'once': args.once}
+            )
+            for _ in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        return
+
+    queue = JobQueue()
+    try:
+        if args.command == 'enqueue':
+            for folder in args.folders:
+                folder = os.path.basename(os.path.normpath(folder))
+                print(f"Queued {folder} as job {queue.enqueue(folder)}")
+        elif args.command == 'stats':
+            print_stats(queue)
+        elif args.command == 'list':
+            for job in queue.jobs(args.state):
+                error = f"  ({job['last_error']})" if job['last_error'] else ""
+                print(f"{job['id']:>5}  {job['state']:<7} {job['attempts']} tries  {job['folder']}{error}")
+        elif args.command == 'retry':
+            print("Requeued" if queue.retry(args.job_id, force=args.force) else "Job is not dead (use --force for done jobs)")
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
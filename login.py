@@ -2,13 +2,15 @@ from playwright.sync_api import sync_playwright
 import time
 from dotenv import load_dotenv
 import os
+import browser_config
 
 def login_to_x(username, email, password, user_data_dir="./chrome-data"):
     with sync_playwright() as playwright:
-        # Launch persistent context
+        # Launch persistent context (same fingerprint as the bot so the session carries over)
         browser = playwright.chromium.launch_persistent_context(
             user_data_dir=user_data_dir,
-            headless=False,
+            **browser_config.launch_options(),
+            **browser_config.context_options()
         )
         page = browser.new_page()
         
@@ -52,7 +54,7 @@ def login_to_x(username, email, password, user_data_dir="./chrome-data"):
         input("Press Enter to close the browser...")
         browser.close()
 
-def login_to_x():
+def main():
     # Load environment variables
     load_dotenv()
     
@@ -65,8 +67,7 @@ def login_to_x():
     if not all([username, email, password]):
         raise ValueError("Missing required credentials in .env file. Please check .env.example for required variables.")
     
-    # Your existing login logic here
-    # ...
+    login_to_x(username, email, password)
 
 if __name__ == "__main__":
-    login_to_x() 
\ No newline at end of file
+    main() 
\ No newline at end of file
@@ -21,6 +21,8 @@ def main():
             break
         else:
             print("Invalid choice")
+    
+    manager.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
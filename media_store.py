@@ -0,0 +1,117 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from cache import SQLiteCache
+from downloader import get_downloader
+
+
+class MediaStore:
+    """Content-addressed image store shared by every thread
+    
+    Each image is stored once under ``objects/<sha256[:2]>/<sha256><ext>``,
+    with the hash computed while the download streams to disk. A URL -> hash
+    index lets a URL that was fetched before be served without any network
+    I/O, and per-thread ``tweet_N`` files are hardlinks into the store.
+    """
+    
+    def __init__(self, root=None, downloader=None):
+        self.root = root or os.getenv("MEDIA_STORE_DIR", ".cache/media")
+        self.downloader = downloader or get_downloader()
+        self.objects_dir = os.path.join(self.root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        # The index only points at files on disk, so it never needs to expire
+        self.url_index = SQLiteCache(
+            os.path.join(self.root, "index.sqlite3"),
+            table="url_index",
+            max_entries=0
+        )
+    
+    def object_path(self, digest, ext):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}{ext}")
+    
+    def fetch(self, url):
+        """Return the store path for an image URL, downloading it if needed"""
+        entry = self.url_index.get(url)
+        if entry:
+            path = self.object_path(entry['hash'], entry['ext'])
+            if os.path.exists(path):
+                return path
+        
+        path = self._download(url)
+        if path:
+            digest, ext = os.path.splitext(os.path.basename(path))
+            self.url_index.set(url, {'hash': digest, 'ext': ext})
+        return path
+    
+    def put_bytes(self, data, ext='.jpg'):
+        """Store raw image bytes and return their store path"""
+        temp_file = tempfile.NamedTemporaryFile(dir=self.objects_dir, delete=False)
+        with temp_file:
+            temp_file.write(data)
+        return self._commit(temp_file.name, hashlib.sha256(data).hexdigest(), ext)
+    
+    def save(self, url, output_dir, filename_base):
+        """Fetch an image and link it into ``output_dir`` as ``filename_base<ext>``"""
+        path = self.fetch(url)
+        if not path:
+            return None
+        return self.link(path, output_dir, filename_base)
+    
+    def link(self, path, output_dir, filename_base):
+        """Hardlink a store object into ``output_dir`` (copying across filesystems)
+        
+        The link is swapped in atomically, so an existing file is never seen
+        half-written.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        ext = os.path.splitext(path)[1] or '.jpg'
+        dest = os.path.join(output_dir, f"{filename_base}{ext}")
+        temp_dest = f"{dest}.tmp"
+        if os.path.exists(temp_dest):
+            os.remove(temp_dest)
+        try:
+            os.link(path, temp_dest)
+        except OSError:
+            shutil.copy2(path, temp_dest)
+        os.replace(temp_dest, dest)
+        return dest
+    
+    def _download(self, url):
+        """Stream an image into the store, hashing it on the way"""
+        temp_name = None
+        try:
+            digest = hashlib.sha256()
+            temp_file = tempfile.NamedTemporaryFile(dir=self.objects_dir, delete=False)
+            temp_name = temp_file.name
+            
+            def write(chunk):
+                digest.update(chunk)
+                temp_file.write(chunk)
+            
+            with temp_file:
+                metrics = self.downloader.download(url, write)
+            
+            path = self._commit(temp_name, digest.hexdigest(), metrics['ext'])
+            temp_name = None
+            return path
+            
+        except Exception as e:
+            print(f"Error downloading image: {e}")
+            return None
+        finally:
+            if temp_name and os.path.exists(temp_name):
+                os.unlink(temp_name)
+    
+    def _commit(self, temp_name, digest, ext):
+        """Move a finished temp file to its content address, deduplicating"""
+        path = self.object_path(digest, ext)
+        if os.path.exists(path):
+            os.unlink(temp_name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_name, path)
+        return path
+    
+    def close(self):
+        self.url_index.close()
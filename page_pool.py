@@ -0,0 +1,223 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PagePool:
+    """Pool of warm, reusable pages in one browser context
+    
+    Pages are pre-navigated to ``warm_url`` and reset back to it when they are
+    released, so the next user skips page creation and first paint. A page is
+    recycled (closed and replaced) after ``max_uses`` leases or once its JS
+    heap grows past ``memory_limit_mb``.
+    """
+    
+    def __init__(self, context, size=2, warm_url=None, max_uses=25, memory_limit_mb=512,
+                 wait_until='domcontentloaded'):
+        self.context = context
+        self.size = size
+        self.warm_url = warm_url
+        self.max_uses = max_uses
+        self.memory_limit_mb = memory_limit_mb
+        self.wait_until = wait_until
+        self._idle = []
+        self._uses = {}
+        self._leased = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        # Slots reserved for pages being opened outside the lock
+        self._creating = 0
+        
+        self.acquisitions = 0
+        self.created = 0
+        self.recycled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._busy_since = None
+        self._busy_time = 0.0
+        self._started = time.monotonic()
+    
+    def prewarm(self, count=None):
+        """Open and warm up to ``count`` pages (defaults to the pool size)"""
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._cond:
+                if self._closed or len(self._uses) + self._creating >= count:
+                    return
+                self._creating += 1
+            page = self._create_page()
+            with self._cond:
+                self._creating -= 1
+                added = page is not None and not self._closed
+                if added:
+                    self._uses[page] = 0
+                    self.created += 1
+                    self._idle.append(page)
+                self._cond.notify()
+            if not added:
+                if page is not None:
+                    self._close_page(page)
+                return
+    
+    def _create_page(self):
+        """Open and warm a page without holding the lock; None if it couldn't be opened"""
+        try:
+            page = self.context.new_page()
+        except Exception as e:
+            print(f"Opening page failed: {e}")
+            return None
+        if self.warm_url:
+            try:
+                page.goto(self.warm_url, wait_until=self.wait_until)
+            except Exception as e:
+                print(f"Warming page failed: {e}")
+        return page
+    
+    def _lease(self, page, start):
+        """Record a page as leased (call with the lock held)"""
+        if not self._leased:
+            self._busy_since = time.monotonic()
+        self._leased.add(page)
+        
+        waited = time.monotonic() - start
+        self.acquisitions += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return page
+    
+    def acquire(self, timeout=30):
+        """Lease a warm page, waiting up to ``timeout`` seconds if all are in use
+        
+        A missing page is opened and warmed outside the lock, with its slot
+        reserved so the pool never grows past ``size``.
+        """
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise TimeoutError("Page pool is closed")
+                if self._idle:
+                    page = self._idle.pop()
+                    if page.is_closed():
+                        # Closed behind our back (e.g. by the browser service); replace it
+                        self._forget(page)
+                        continue
+                    return self._lease(page, start)
+                if len(self._uses) + self._creating < self.size:
+                    self._creating += 1
+                    break
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    raise TimeoutError(f"No page available after {timeout}s")
+                self._cond.wait(remaining)
+        
+        page = self._create_page()
+        with self._cond:
+            self._creating -= 1
+            self._cond.notify()
+            if page is None:
+                raise Exception("Could not open a new page")
+            if not self._closed:
+                self._uses[page] = 0
+                self.created += 1
+                return self._lease(page, start)
+        self._close_page(page)
+        raise TimeoutError("Page pool is closed")
+    
+    def release(self, page):
+        """Return a page, resetting it for reuse or recycling it if worn out
+        
+        The reset navigation runs outside the lock so other leases and
+        releases don't wait on a page load.
+        """
+        with self._cond:
+            self._leased.discard(page)
+            if not self._leased and self._busy_since is not None:
+                self._busy_time += time.monotonic() - self._busy_since
+                self._busy_since = None
+            uses = self._uses[page] = self._uses.get(page, 0) + 1
+            closed = self._closed
+        
+        reusable = not closed and not self._should_recycle(page, uses)
+        if reusable:
+            try:
+                page.goto(self.warm_url or 'about:blank', wait_until='commit')
+            except Exception:
+                reusable = False
+        
+        with self._cond:
+            keep = reusable and not self._closed
+            if keep:
+                self._idle.append(page)
+            else:
+                self._forget(page)
+            self._cond.notify()
+        if not keep:
+            self._close_page(page)
+    
+    @contextmanager
+    def lease(self, timeout=30):
+        page = self.acquire(timeout)
+        try:
+            yield page
+        finally:
+            self.release(page)
+    
+    def _should_recycle(self, page, uses):
+        if page.is_closed() or uses >= self.max_uses:
+            return True
+        if self.memory_limit_mb:
+            try:
+                heap = page.evaluate(
+                    "() => performance.memory ? performance.memory.usedJSHeapSize : 0"
+                )
+                return heap / (1024 * 1024) > self.memory_limit_mb
+            except Exception:
+                return True
+        return False
+    
+    def _forget(self, page):
+        """Drop a page from the pool's books (call with the lock held)"""
+        self._uses.pop(page, None)
+        self.recycled += 1
+    
+    def _close_page(self, page):
+        try:
+            if not page.is_closed():
+                page.close()
+        except Exception:
+            pass
+    
+    def stats(self):
+        """Utilization and wait-time statistics"""
+        with self._cond:
+            busy = self._busy_time
+            if self._busy_since is not None:
+                busy += time.monotonic() - self._busy_since
+            elapsed = time.monotonic() - self._started
+            return {
+                'size': self.size,
+                'open': len(self._uses),
+                'in_use': len(self._leased),
+                'idle': len(self._idle),
+                'utilization': len(self._leased) / self.size if self.size else 0.0,
+                'busy_fraction': busy / elapsed if elapsed else 0.0,
+                'acquisitions': self.acquisitions,
+                'avg_wait': self.total_wait / self.acquisitions if self.acquisitions else 0.0,
+                'max_wait': self.max_wait,
+                'created': self.created,
+                'recycled': self.recycled
+            }
+    
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for page in list(self._uses):
+                try:
+                    page.close()
+                except Exception:
+                    pass
+            self._idle.clear()
+            self._uses.clear()
+            self._leased.clear()
+            self._cond.notify_all()
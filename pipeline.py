@@ -0,0 +1,180 @@
+"""Staged executor: bounded queues between stages, each stage with its own workers.
+
+Items flow through the stages in order. A full queue blocks the stage that
+feeds it, so a slow stage throttles everything upstream instead of letting
+work pile up, and throughput ends up set by the slowest stage.
+"""
+import threading
+import time
+import queue
+
+_DONE = object()
+
+
+class Stage:
+    """One step of a pipeline
+
+    ``handler(item, state)`` returns the item for the next stage, or None to
+    drop it. ``setup()`` runs once in each worker thread and its return value is
+    passed as ``state``; ``teardown(state)`` runs when the worker exits. Use them
+    for per-worker resources such as a browser.
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=4, setup=None, teardown=None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.setup = setup
+        self.teardown = teardown
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_depth = 0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.blocked_seconds = 0.0
+        self._live_workers = 0
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        """Queue an item for this stage, blocking while the queue is full"""
+        start = time.perf_counter()
+        self.queue.put(item)
+        waited = time.perf_counter() - start
+        depth = self.queue.qsize()
+        with self._lock:
+            self.blocked_seconds += waited
+            self.max_depth = max(self.max_depth, depth)
+            self.depth_samples += 1
+            self.depth_total += depth
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'processed': self.processed,
+                'failed': self.failed,
+                'busy_seconds': round(self.busy_seconds, 3),
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_depth,
+                'avg_queue_depth': round(self.depth_total / self.depth_samples, 2) if self.depth_samples else 0,
+                'blocked_seconds': round(self.blocked_seconds, 3)
+            }
+
+
+class Pipeline:
+    """Runs items through ``stages`` with every stage's workers running concurrently
+
+    ``on_done(item)`` is called for items that leave the last stage and
+    ``on_error(item, stage_name, exc)`` for items a handler raised on; both are
+    called from worker threads.
+    """
+
+    def __init__(self, stages, on_done=None, on_error=None):
+        self.stages = list(stages)
+        self.on_done = on_done
+        self.on_error = on_error
+        self._threads = []
+        self._started = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        for index, stage in enumerate(self.stages):
+            stage._live_workers = stage.workers
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work, args=(index,), name=f"{stage.name}-{n + 1}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def submit(self, item):
+        """Feed an item to the first stage; blocks while that stage is saturated"""
+        self.stages[0].put(item)
+
+    def close(self):
+        """Stop accepting items, let everything in flight finish and join the workers"""
+        for _ in range(self.stages[0].workers):
+            self.stages[0].queue.put(_DONE)
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self, index):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        state = None
+        try:
+            if stage.setup:
+                state = stage.setup()
+            while True:
+                item = stage.queue.get()
+                if item is _DONE:
+                    break
+                start = time.perf_counter()
+                try:
+                    result = stage.handler(item, state)
+                except Exception as e:
+                    with stage._lock:
+                        stage.failed += 1
+                        stage.busy_seconds += time.perf_counter() - start
+                    if self.on_error:
+                        self.on_error(item, stage.name, e)
+                    continue
+                with stage._lock:
+                    stage.processed += 1
+                    stage.busy_seconds += time.perf_counter() - start
+                if result is None:
+                    continue
+                if next_stage:
+                    next_stage.put(result)
+                elif self.on_done:
+                    self.on_done(result)
+        except Exception as e:
+            # This worker can't go on; fail whatever it picks up so upstream doesn't block
+            print(f"✗ {stage.name} worker stopped: {e}")
+            while True:
+                item = stage.queue.get()
+                if item is _DONE:
+                    break
+                with stage._lock:
+                    stage.failed += 1
+                if self.on_error:
+                    self.on_error(item, stage.name, e)
+        finally:
+            if stage.teardown and state is not None:
+                try:
+                    stage.teardown(state)
+                except Exception as e:
+                    print(f"Error shutting down {stage.name} worker: {e}")
+            with stage._lock:
+                stage._live_workers -= 1
+                last = stage._live_workers == 0
+            # The last worker out passes the shutdown on to the next stage
+            if last and next_stage:
+                for _ in range(next_stage.workers):
+                    next_stage.queue.put(_DONE)
+
+    def metrics(self):
+        """Per-stage counters, busy time and queue depths"""
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def report(self):
+        """Print the metrics table and point out the bottleneck stage"""
+        elapsed = time.perf_counter() - self._started if self._started else 0
+        metrics = self.metrics()
+        print("\n=== Pipeline stages ===")
+        print(f"{'stage':<10}{'workers':>8}{'done':>6}{'failed':>7}{'busy %':>8}{'max q':>7}{'avg q':>7}{'blocked s':>10}")
+        bottleneck, highest = None, -1
+        for name, stats in metrics.items():
+            utilization = stats['busy_seconds'] / (elapsed * stats['workers']) if elapsed else 0
+            if utilization > highest:
+                bottleneck, highest = name, utilization
+            print(f"{name:<10}{stats['workers']:>8}{stats['processed']:>6}{stats['failed']:>7}"
+                  f"{utilization * 100:>7.0f}%{stats['max_queue_depth']:>7}{stats['avg_queue_depth']:>7}"
+                  f"{stats['blocked_seconds']:>10.1f}")
+        if bottleneck:
+            print(f"Slowest stage: {bottleneck}")
+        print("=======================\n")
+        return metrics
@@ -0,0 +1,93 @@
+import time
+
+TWEET_URL = "https://x.com/{screen_name}/status/{id}"
+
+
+class PostRejected(Exception):
+    """X answered a CreateTweet request with an error"""
+
+
+def is_create_tweet(response):
+    return '/CreateTweet' in response.url and response.request.method == 'POST'
+
+
+def parse_create_tweet(body):
+    """Pull (tweet_id, url) out of a CreateTweet response body, or raise PostRejected"""
+    result = (((body.get('data') or {}).get('create_tweet') or {})
+              .get('tweet_results') or {}).get('result') or {}
+    # Tweets with visibility notices wrap the actual result
+    result = result.get('tweet', result)
+    tweet_id = result.get('rest_id') or (result.get('legacy') or {}).get('id_str')
+    if not tweet_id:
+        errors = body.get('errors') or []
+        message = '; '.join(error.get('message', '') for error in errors) or "no tweet in response"
+        raise PostRejected(message)
+
+    user = ((result.get('core') or {}).get('user_results') or {}).get('result') or {}
+    screen_name = (user.get('core') or {}).get('screen_name') or (user.get('legacy') or {}).get('screen_name')
+    return tweet_id, TWEET_URL.format(screen_name=screen_name or 'i/web', id=tweet_id)
+
+
+class PostCapture:
+    """Watches a page's CreateTweet traffic while a post is in flight
+
+    Use it as a context manager around the click on the Post button, then call
+    wait(count): it returns as soon as X has answered for ``count`` tweets
+    (a thread sends one CreateTweet per tweet, in order) and raises
+    PostRejected when X refuses one of them.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.tweets = []
+        self.error = None
+        self._responses = []
+
+    def __enter__(self):
+        self.page.on('response', self._on_response)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.page.remove_listener('response', self._on_response)
+        return False
+
+    def _on_response(self, response):
+        # Bodies are read in wait(), not from inside the event handler
+        if is_create_tweet(response):
+            self._responses.append(response)
+
+    def _drain(self):
+        while self._responses and not self.error:
+            response = self._responses.pop(0)
+            try:
+                body = response.json()
+            except Exception:
+                self.error = PostRejected(f"HTTP {response.status} with an unreadable body")
+                return
+            try:
+                tweet_id, url = parse_create_tweet(body)
+            except PostRejected as e:
+                self.error = PostRejected(f"HTTP {response.status}: {e}")
+                return
+            self.tweets.append({'id': tweet_id, 'url': url})
+
+    def wait(self, count, timeout):
+        """Wait (``timeout`` ms) for ``count`` confirmed tweets; returns them in order"""
+        deadline = time.monotonic() + timeout / 1000
+        while True:
+            self._drain()
+            if self.error:
+                raise self.error
+            if len(self.tweets) >= count:
+                return self.tweets
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(
+                    f"X confirmed {len(self.tweets)} of {count} tweets within {timeout / 1000:.1f}s"
+                )
+            try:
+                # Short slices so a response that lands between checks is never missed for long
+                self.page.wait_for_event('response', predicate=is_create_tweet,
+                                         timeout=min(remaining * 1000, 250))
+            except Exception:
+                pass
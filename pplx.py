@@ -1,11 +1,10 @@
-from openai import OpenAI
 import os
 from datetime import datetime
 import re
 
 from dotenv import load_dotenv
+from ai_provider import CachedProvider, PerplexityProvider
 load_dotenv()
-YOUR_API_KEY = os.getenv("PPLX_API_KEY")
 
 def read_prompt(filename):
     with open(filename, 'r') as f:
@@ -53,34 +52,24 @@ def main():
     system_prompt = read_prompt('prompts/system_prompt.md')
     user_prompt = read_prompt('prompts/user_prompt.md')
 
-    messages = [
-        {
-            "role": "system",
-            "content": system_prompt
-        },
-        {
-            "role": "user",
-            "content": user_prompt
-        }
-    ]
-
-    client = OpenAI(api_key=YOUR_API_KEY, base_url="https://api.perplexity.ai")
+    # Identical prompts are served from the on-disk cache (LLM_CACHE_BYPASS=1 to skip)
+    provider = CachedProvider(PerplexityProvider(system_prompt=system_prompt))
 
     # Generate filename based on prompt content
     output_filename = generate_filename(user_prompt)
 
     # Get response
-    response = client.chat.completions.create(
-        model="sonar-pro",
-        messages=messages,
-    )
+    response_content = provider.generate_completion(user_prompt)
+    if not response_content:
+        print("No response received, nothing written")
+        return
 
     # Write output to file
     write_output(
         output_filename,
         system_prompt,
         user_prompt,
-        response.choices[0].message.content
+        response_content
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+import inspect
+import os
+import threading
+from urllib.parse import urlparse
+
+# Per-site routing rules, chosen by the host of the page making the request.
+# Hosts in "allow" always load; otherwise a request is blocked when its resource
+# type is in "block_types" or its host is in "block_hosts". Blocked scripts are
+# stubbed with an empty body so page code that expects them doesn't error.
+SITE_RULES = {
+    'x': {
+        'pages': ('twitter.com', 'x.com'),
+        'allow': ('api.twitter.com', 'api.x.com', 'upload.twitter.com', 'upload.x.com'),
+        'block_types': ('font', 'media', 'image'),
+        'block_hosts': (
+            'video.twimg.com', 'ads-twitter.com', 'ads-api.twitter.com',
+            'analytics.twitter.com', 'google-analytics.com', 'doubleclick.net',
+            'googletagmanager.com'
+        ),
+    },
+    'google': {
+        'pages': ('google.com',),
+        'allow': (),
+        'block_types': ('font', 'media', 'image'),
+        'block_hosts': (
+            'googleadservices.com', 'doubleclick.net', 'google-analytics.com',
+            'googletagmanager.com', 'play.google.com', 'ogs.google.com'
+        ),
+    },
+}
+
+# Rough transfer sizes used to estimate what blocking saved
+TYPICAL_BYTES = {
+    'font': 40_000,
+    'media': 500_000,
+    'image': 30_000,
+    'script': 60_000,
+}
+DEFAULT_BYTES = 10_000
+
+
+def _host_matches(host, domains):
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+class RequestRouter:
+    """Blocks or stubs resources the bot never looks at on X and Google
+    
+    Install it on a browser context. Counters accumulate until report() is
+    called, which prints and resets them, so callers report per navigation.
+    """
+    
+    def __init__(self, rules=None):
+        self.rules = rules or SITE_RULES
+        self._lock = threading.Lock()
+        self._reset()
+    
+    def _reset(self):
+        self.blocked = {}
+        self.stubbed = 0
+        self.estimated_bytes_saved = 0
+    
+    def install(self, context):
+        """Route every request of ``context`` through this router
+        
+        Returns the router; with an async context it returns an awaitable
+        that resolves to the router once the route is registered.
+        """
+        registered = context.route("**/*", self._handle)
+        if inspect.isawaitable(registered):
+            async def installed():
+                await registered
+                return self
+            return installed()
+        return self
+    
+    def _site_rules(self, request):
+        try:
+            page_host = urlparse(request.frame.page.url).netloc
+        except Exception:
+            page_host = ''
+        for rules in self.rules.values():
+            if _host_matches(page_host, rules['pages']):
+                return rules
+        return None
+    
+    def _handle(self, route, request):
+        url = request.url
+        if not url.startswith('http'):
+            return route.continue_()
+        
+        rules = self._site_rules(request)
+        host = urlparse(url).netloc
+        if rules is None or _host_matches(host, rules['allow']):
+            return route.continue_()
+        
+        resource_type = request.resource_type
+        blocked_host = _host_matches(host, rules['block_hosts'])
+        if resource_type not in rules['block_types'] and not blocked_host:
+            return route.continue_()
+        
+        with self._lock:
+            self.blocked[resource_type] = self.blocked.get(resource_type, 0) + 1
+            self.estimated_bytes_saved += TYPICAL_BYTES.get(resource_type, DEFAULT_BYTES)
+            if resource_type == 'script':
+                self.stubbed += 1
+        
+        if resource_type == 'script':
+            return route.fulfill(status=200, content_type='application/javascript', body='')
+        return route.abort()
+    
+    def report(self, label):
+        """Print and reset the counters for the navigation that just happened"""
+        with self._lock:
+            total = sum(self.blocked.values())
+            summary = {
+                'label': label,
+                'blocked': total,
+                'blocked_by_type': dict(self.blocked),
+                'stubbed': self.stubbed,
+                'estimated_bytes_saved': self.estimated_bytes_saved
+            }
+            self._reset()
+        if total:
+            print(f"🛡 {label}: blocked {total} requests, ~{summary['estimated_bytes_saved'] / 1024:.0f} KB saved")
+        return summary
+
+
+def install_router(context):
+    """Install the default router unless BLOCK_RESOURCES=0; returns it or None"""
+    if os.getenv("BLOCK_RESOURCES", "1") != "1":
+        return None
+    return RequestRouter().install(context)
@@ -1,23 +1,670 @@
-from ai_provider import AIProvider, PerplexityProvider
-from typing import Dict, List
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from ai_provider import AIProvider, CachedProvider, PerplexityProvider
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# A tweet starts on a line that begins with its number: "3/10", "3 / 10", "3/",
+# "**3/10**", "(3/10)", "Tweet 3/10:". Dates like "1/10/2024" don't count. The
+# match covers the decoration so the tweet can carry a plain "3/10" instead.
+TWEET_MARKER = re.compile(
+    r'^[ \t]*[>*_#(\[]*[ \t]*(?:tweet[ \t]*)?(\d{1,3})[ \t]*/[ \t]*(\d{1,3})?(?![\d/])[*_)\]]*:?',
+    re.IGNORECASE | re.MULTILINE
+)
+IMG_TAG = re.compile(r'\[\s*IMG\s*:\s*([^\]]*?)\s*\]', re.IGNORECASE)
+# An image tag cut off by the end of a truncated response
+UNCLOSED_IMG_TAG = re.compile(r'\[\s*IMG\s*:?\s*([^\]]*)$', re.IGNORECASE)
+SEPARATOR_LINE = re.compile(r'^[ \t]*(?:-{3,}|\*{3,}|_{3,})[ \t]*$', re.MULTILINE)
+# How far the numbering may jump before a "number/" line is taken to be ordinary text
+MAX_MARKER_GAP = 3
+MAX_TWEET_LENGTH = 280
+URL_PATTERN = re.compile(r'https?://\S+')
+# X counts every URL as 23 characters
+URL_LENGTH = 23
+# Output budget in JSON mode: a full tweet with emoji and its image query is
+# about 120 tokens, the rest is JSON punctuation and slack
+JSON_TOKENS_PER_TWEET = 180
+JSON_TOKENS_OVERHEAD = 150
+# Output budgets for outline-then-expand generation
+OUTLINE_TOKENS_PER_TWEET = 40
+EXPAND_TOKENS = 200
+# "3. point", "3) point", "**3:** point"
+OUTLINE_LINE = re.compile(r'^[ \t]*[-*#>]*[ \t]*(\d{1,3})[ \t]*[.):/][*_]*[ \t]*(.+?)[ \t]*$', re.MULTILINE)
+CODE_FENCE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.IGNORECASE)
+
+
+class MarkerSequence:
+    """Decides which numbered lines really start the next tweet
+    
+    Markers have to count upwards and stay within the thread length, and a
+    marker without a matching total may only skip a few numbers, so
+    "24/7 support" in tweet 3 of 10 is just text.
+    """
+    
+    def __init__(self, expected: Optional[int] = None):
+        self.expected = expected
+        self.last = 0
+    
+    def accept(self, number: int, total: Optional[str]) -> bool:
+        total = int(total) if total else None
+        if total and number > total:
+            return False
+        if self.last == 0 and number == 1 and total:
+            # The first marker says how long the thread actually is
+            self.expected = total
+        elif total and self.expected and total != self.expected:
+            return False
+        if number <= self.last:
+            return False
+        # Without a matching total, a big jump is more likely text than a marker
+        if not total and number > self.last + MAX_MARKER_GAP:
+            return False
+        if self.expected and number > self.expected:
+            return False
+        if total and not self.expected:
+            self.expected = total
+        self.last = number
+        return True
+
+
+def split_tweet(marker: re.Match, body: str) -> Tuple[str, str]:
+    """Turn a tweet's marker and the text after it into (tweet text, image query)
+    
+    The image query is empty for tweets without an [IMG: ...] tag.
+    """
+    match = IMG_TAG.search(body) or UNCLOSED_IMG_TAG.search(body)
+    if match:
+        body, image_query = body[:match.start()], ' '.join(match.group(1).split())
+    else:
+        image_query = ''
+    body = ' '.join(body.split())
+    if not body:
+        return '', image_query
+    return f"{marker.group(1)}/{marker.group(2) or ''} {body}", image_query
+
+
+def parse_thread_text(response: str, expected: Optional[int] = None) -> Dict:
+    """Split a completion into tweets in one pass over its markers
+    
+    Returns the tweets and image queries that were found, their numbers, the
+    thread length and the numbers of any tweets that are ``missing``. Tweets
+    without an [IMG: ...] tag are kept with an empty image query.
+    """
+    if '---' in response or '***' in response or '___' in response:
+        response = SEPARATOR_LINE.sub('', response)
+    sequence = MarkerSequence(expected)
+    markers = [
+        match for match in TWEET_MARKER.finditer(response)
+        if sequence.accept(int(match.group(1)), match.group(2))
+    ]
+    
+    tweets, image_queries, numbers = [], [], []
+    for k, marker in enumerate(markers):
+        end = markers[k + 1].start() if k + 1 < len(markers) else len(response)
+        text, image_query = split_tweet(marker, response[marker.end():end])
+        if text:
+            tweets.append(text)
+            image_queries.append(image_query)
+            numbers.append(int(marker.group(1)))
+    
+    expected = sequence.expected or len(numbers)
+    found = set(numbers)
+    return {
+        'tweets': tweets,
+        'image_queries': image_queries,
+        'numbers': numbers,
+        'expected': expected,
+        'missing': [n for n in range(1, expected + 1) if n not in found]
+    }
+
+
+def tweet_length(text: str) -> int:
+    """Length of a tweet the way X counts it: URLs are 23, most non-Latin characters and emoji 2"""
+    length = 0
+    for url in URL_PATTERN.findall(text):
+        length += URL_LENGTH
+    for char in URL_PATTERN.sub('', text):
+        code = ord(char)
+        light = (code <= 4351 or 8192 <= code <= 8205 or 8208 <= code <= 8223 or 8242 <= code <= 8247)
+        length += 1 if light else 2
+    return length
+
+
+def over_length(thread: Dict) -> List[int]:
+    """Numbers of the tweets in ``thread`` that X would reject as too long"""
+    numbers = thread.get('numbers') or list(range(1, len(thread['tweets']) + 1))
+    return [number for number, tweet in zip(numbers, thread['tweets']) if tweet_length(tweet) > MAX_TWEET_LENGTH]
+
+
+def tweet_text_limit(num_tweets: int) -> int:
+    """Characters left for a tweet's text once its "n/N " number is added"""
+    return MAX_TWEET_LENGTH - len(f"{num_tweets}/{num_tweets} ")
+
+
+def thread_schema(num_tweets: int) -> Dict:
+    """JSON schema for a structured thread response"""
+    return {
+        'type': 'object',
+        'properties': {
+            'tweets': {
+                'type': 'array',
+                'minItems': num_tweets,
+                'maxItems': num_tweets,
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'text': {'type': 'string', 'maxLength': tweet_text_limit(num_tweets)},
+                        'image_query': {'type': 'string'}
+                    },
+                    'required': ['text', 'image_query']
+                }
+            }
+        },
+        'required': ['tweets']
+    }
+
+
+def parse_thread_json(response: str, expected: Optional[int] = None) -> Optional[Dict]:
+    """Read a structured thread response with a single json.loads
+    
+    Returns the same shape as parse_thread_text, with tweets numbered by
+    position, or None if the response isn't a JSON thread.
+    """
+    try:
+        data = json.loads(CODE_FENCE.sub('', response))
+    except ValueError:
+        return None
+    items = data.get('tweets') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return None
+    
+    total = expected or len(items)
+    tweets, image_queries, numbers = [], [], []
+    for number, item in enumerate(items[:total], start=1):
+        text = ' '.join(str(item.get('text') or '').split())
+        # Models sometimes number the tweets themselves anyway
+        marker = TWEET_MARKER.match(text)
+        if marker:
+            text = text[marker.end():].strip()
+        if not text:
+            continue
+        tweets.append(f"{number}/{total} {text}")
+        image_queries.append(' '.join(str(item.get('image_query') or '').split()))
+        numbers.append(number)
+    
+    return {
+        'tweets': tweets,
+        'image_queries': image_queries,
+        'numbers': numbers,
+        'expected': total,
+        'missing': [n for n in range(1, total + 1) if n not in numbers]
+    }
+
 
 class ThreadGenerator:
-    def __init__(self, ai_provider: AIProvider = None):
-        """Initialize with an AI provider (defaults to Perplexity)"""
-        self.ai_provider = ai_provider or PerplexityProvider()
+    def __init__(self, ai_provider: AIProvider = None, json_output: Optional[bool] = None):
+        """Initialize with an AI provider (defaults to cached Perplexity)
+        
+        With ``json_output`` (or THREAD_JSON_OUTPUT=1) complete() asks for a
+        schema-constrained JSON thread; streaming always uses the text format.
+        """
+        self.ai_provider = ai_provider or CachedProvider(PerplexityProvider())
+        if json_output is None:
+            json_output = os.getenv("THREAD_JSON_OUTPUT", "0") == "1"
+        self.json_output = json_output
+        # Threads this long are outlined first and expanded tweet by tweet (0 turns it off)
+        self.outline_min_tweets = int(os.getenv("THREAD_OUTLINE_MIN_TWEETS", "0"))
+        self.expand_concurrency = int(os.getenv("THREAD_EXPAND_CONCURRENCY", "6"))
+        # Completions raced per thread (1 turns it off), and the most speculative and
+        # repair completions one topic may use within a rolling window
+        self.speculative = int(os.getenv("THREAD_SPECULATIVE", "1"))
+        self.topic_max_calls = int(os.getenv("THREAD_TOPIC_MAX_CALLS", "6"))
+        self.topic_window = float(os.getenv("THREAD_TOPIC_WINDOW_SECONDS", "3600"))
+        self._spent = {}
+        self._spent_lock = threading.Lock()
+        self.last_response = ""
+    
+    def generate_thread(self, topic: str, num_tweets: int = 10,
+                        on_tweet: Optional[Callable[[int, str, str], None]] = None) -> Dict[str, List[str]]:
+        """Generate a thread about a topic
+        
+        Returns {'tweets', 'image_queries', 'missing', ...} (see
+        parse_thread_text); ``missing`` lists tweet numbers the response lacked.
+        None means no tweets could be parsed at all.
+        
+        If ``on_tweet`` is given the completion is streamed and the callback is
+        called with (index, tweet, image_query) as soon as each tweet is complete.
+        JSON mode can't be split before the response is complete, so there the
+        callback runs for every tweet once the whole thread has been parsed.
+        Threads of at least ``outline_min_tweets`` go through generate_outlined(),
+        and other threads are raced with generate_speculative() when
+        ``speculative`` is above 1; there ``on_tweet`` runs for the winner's tweets.
+        """
+        if self.uses_outline(num_tweets):
+            thread = self.generate_outlined(topic, num_tweets, on_tweet)
+            if thread is not None:
+                return thread
+            print("Outline failed, generating the thread in one completion")
+        elif self.speculative > 1:
+            return self._replay(self.generate_speculative(topic, num_tweets), on_tweet)
+        
+        if on_tweet and self.json_output:
+            prompt, response = self.complete(topic, num_tweets)
+            return self._replay(self._checked_parse(prompt, response, num_tweets), on_tweet)
+        
+        if on_tweet:
+            try:
+                for index, tweet, image_query in self.stream_thread(topic, num_tweets):
+                    on_tweet(index, tweet, image_query)
+            except Exception as e:
+                # Keep the tweets that arrived; the rest come back as missing and can be repaired
+                print(f"❌ Stream stopped early: {e}")
+            return self._checked_parse(self._create_prompt(topic, num_tweets), self.last_response, num_tweets,
+                                       structured=False)
+        
+        prompt, response = self.complete(topic, num_tweets)
+        return self._checked_parse(prompt, response, num_tweets)
+    
+    def topic_budget(self, topic: str) -> int:
+        """Completions ``topic`` may still use in the current window"""
+        with self._spent_lock:
+            cutoff = time.monotonic() - self.topic_window
+            recent = [at for at in self._spent.get(topic, []) if at > cutoff]
+            if recent:
+                self._spent[topic] = recent
+            else:
+                self._spent.pop(topic, None)
+            return max(0, self.topic_max_calls - len(recent))
+    
+    def _charge(self, topic: str):
+        with self._spent_lock:
+            self._spent.setdefault(topic, []).append(time.monotonic())
+    
+    def _replay(self, thread: Optional[Dict], on_tweet: Optional[Callable[[int, str, str], None]]):
+        """Call ``on_tweet`` for every tweet of a thread that wasn't streamed"""
+        if thread and on_tweet:
+            for index, (tweet, image_query) in enumerate(zip(thread['tweets'], thread['image_queries'])):
+                on_tweet(index, tweet, image_query)
+        return thread
+    
+    def complete(self, topic: str, num_tweets: int = 10) -> Tuple[str, str]:
+        """Only call the model; returns (prompt, raw response) for parse()"""
+        try:
+            self.ai_provider.start()
+            
+            if self.json_output:
+                prompt = self._create_json_prompt(topic, num_tweets)
+            else:
+                prompt = self._create_prompt(topic, num_tweets)
+            response = self.ai_provider.generate_completion(prompt, **self._completion_options(num_tweets))
+            self.last_response = response
+            return prompt, response
+            
+        finally:
+            self.ai_provider.close()
+    
+    def parse(self, prompt: str, response: str, num_tweets: Optional[int] = None) -> Optional[Dict]:
+        """Parse a response from complete(); None if no tweets could be found"""
+        return self._checked_parse(prompt, response, num_tweets)
+    
+    def _completion_options(self, num_tweets: Optional[int]) -> Dict:
+        """Request options for the thread completion: a response schema and token budget in JSON mode"""
+        if not self.json_output or not num_tweets:
+            return {}
+        return {
+            'response_format': {'type': 'json_schema', 'json_schema': {'schema': thread_schema(num_tweets)}},
+            'max_tokens': JSON_TOKENS_PER_TWEET * num_tweets + JSON_TOKENS_OVERHEAD
+        }
     
-    def generate_thread(self, topic: str, num_tweets: int = 10) -> Dict[str, List[str]]:
-        """Generate a thread about a topic"""
+    def _checked_parse(self, prompt: str, response: str, expected: Optional[int] = None,
+                       structured: Optional[bool] = None):
+        """Parse a response, dropping it from the provider cache if it's unusable"""
+        if structured is None:
+            structured = self.json_output
+        thread = self._parse_thread(response, expected, structured)
+        if thread is None and hasattr(self.ai_provider, "invalidate"):
+            # Otherwise a retry would just get the same broken response back
+            options = self._completion_options(expected) if structured else {}
+            self.ai_provider.invalidate(prompt, **options)
+        return thread
+    
+    def stream_thread(self, topic: str, num_tweets: int = 10) -> Iterator[Tuple[int, str, str]]:
+        """Stream a thread, yielding (index, tweet, image_query) per finished tweet
+        
+        A tweet is finished once its [IMG: ...] tag closes or the next tweet
+        marker starts, so callers can act on tweet 1 while the rest is still
+        being generated. The full raw response ends up in ``last_response``.
+        """
+        parser = ThreadStreamParser(self, num_tweets)
+        chunks = []
         try:
             self.ai_provider.start()
             
             prompt = self._create_prompt(topic, num_tweets)
-            response = self.ai_provider.generate_completion(prompt)
+            for chunk in self.ai_provider.stream_completion(prompt):
+                chunks.append(chunk)
+                yield from parser.feed(chunk)
+            yield from parser.finish()
+            
+        finally:
+            self.last_response = ''.join(chunks)
+            self.ai_provider.close()
+    
+    def generate_speculative(self, topic: str, num_tweets: int = 10,
+                             attempts: Optional[int] = None) -> Optional[Dict]:
+        """Race ``attempts`` completions and keep the first usable thread
+        
+        Usable means every tweet parsed and none is over the length limit. As
+        soon as one is, the other streams are cancelled; a failed attempt is
+        replaced while the topic has budget left (topic_budget(): at most
+        ``topic_max_calls`` completions per ``topic_window`` seconds, shared with
+        retries and repair_thread). The cache is bypassed so
+        the attempts are independent samples. If no attempt is usable, the most
+        complete one is returned for repair_thread(), or None without tweets.
+        """
+        attempts = max(1, attempts or self.speculative)
+        budget = self.topic_budget(topic)
+        if budget <= 0:
+            print(f"✗ This topic already used its {self.topic_max_calls} completions, try again later")
+            return None
+        
+        provider = self.ai_provider.provider if isinstance(self.ai_provider, CachedProvider) else self.ai_provider
+        if self.json_output:
+            prompt = self._create_json_prompt(topic, num_tweets)
+        else:
+            prompt = self._create_prompt(topic, num_tweets)
+        options = self._completion_options(num_tweets)
+        cancel = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=attempts)
+        pending = set()
+        best = None
+        spent = 0
+        
+        def launch():
+            nonlocal spent
+            spent += 1
+            self._charge(topic)
+            pending.add(executor.submit(self._speculate, provider, prompt, options, num_tweets, cancel))
+        
+        print(f"Racing {min(attempts, budget)} completions...")
+        try:
+            self.ai_provider.start()
+            for _ in range(min(attempts, budget)):
+                launch()
+            
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        response, thread = future.result()
+                    except Exception as e:
+                        print(f"✗ Completion failed: {e}")
+                        response, thread = '', None
+                    if thread and not thread['missing'] and not over_length(thread):
+                        cancel.set()
+                        print(f"✓ Got a complete thread after {spent} completion(s)")
+                        self.last_response = response
+                        return thread
+                    if thread and (best is None or len(thread['tweets']) > len(best[1]['tweets'])):
+                        best = (response, thread)
+                    if spent < budget:
+                        launch()
+        finally:
+            cancel.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.ai_provider.close()
+        
+        if best is None:
+            print("✗ No completion produced any tweets")
+            return None
+        self.last_response, thread = best
+        print(f"No complete thread within budget, keeping the best one "
+              f"({len(thread['tweets'])} of {thread['expected']} tweets)")
+        return thread
+    
+    def _speculate(self, provider: AIProvider, prompt: str, options: Dict, expected: int,
+                   cancel: threading.Event) -> Tuple[str, Optional[Dict]]:
+        """One raced completion; gives up early when cancelled or a tweet comes out too long"""
+        stream = provider.stream_completion(prompt, **options)
+        # JSON can't be checked before it's complete
+        parser = None if self.json_output else ThreadStreamParser(self, expected)
+        chunks = []
+        try:
+            for chunk in stream:
+                if cancel.is_set():
+                    return '', None
+                chunks.append(chunk)
+                for _, tweet, _ in (parser.feed(chunk) if parser else []):
+                    if tweet_length(tweet) > MAX_TWEET_LENGTH:
+                        return ''.join(chunks), None
+        finally:
+            stream.close()
+        
+        response = ''.join(chunks)
+        thread = parse_thread_json(response, expected) if self.json_output else None
+        if thread is None:
+            thread = parse_thread_text(response, expected)
+        return response, thread if thread['tweets'] else None
+    
+    def uses_outline(self, num_tweets: int) -> bool:
+        return bool(self.outline_min_tweets) and num_tweets >= self.outline_min_tweets
+    
+    def generate_outlined(self, topic: str, num_tweets: int = 10,
+                          on_tweet: Optional[Callable[[int, str, str], None]] = None) -> Optional[Dict]:
+        """Plan the thread in one short call, then write every tweet in its own call
+        
+        Up to ``expand_concurrency`` tweets are written at once and assembled in
+        order, so a long thread takes about as long as the outline plus one
+        tweet. ``on_tweet`` is called in thread order as tweets become ready.
+        Returns the same dict as generate_thread, or None if there was no
+        usable outline.
+        """
+        try:
+            self.ai_provider.start()
             
-            return self._parse_thread(response)
+            outline = self._outline(topic, num_tweets)
+            if outline is None:
+                return None
             
+            print(f"Writing {num_tweets} tweets, {self.expand_concurrency} at a time...")
+            tweets, image_queries, numbers = [], [], []
+            with ThreadPoolExecutor(max_workers=max(1, min(self.expand_concurrency, num_tweets))) as executor:
+                futures = [
+                    executor.submit(self._expand_tweet, topic, outline, number, num_tweets)
+                    for number in range(1, num_tweets + 1)
+                ]
+                # Waiting in order keeps on_tweet in thread order while later tweets are still being written
+                for number, future in enumerate(futures, start=1):
+                    try:
+                        expanded = future.result()
+                    except Exception as e:
+                        print(f"✗ Error writing tweet {number}: {e}")
+                        continue
+                    if expanded is None:
+                        print(f"✗ Couldn't parse tweet {number}")
+                        continue
+                    tweet, image_query = expanded
+                    tweets.append(tweet)
+                    image_queries.append(image_query)
+                    numbers.append(number)
+                    if on_tweet:
+                        on_tweet(len(tweets) - 1, tweet, image_query)
+        finally:
+            self.ai_provider.close()
+        
+        thread = {
+            'tweets': tweets,
+            'image_queries': image_queries,
+            'numbers': numbers,
+            'expected': num_tweets,
+            'missing': [n for n in range(1, num_tweets + 1) if n not in numbers]
+        }
+        print(f"Processed {len(tweets)} of {num_tweets} tweets")
+        if not tweets:
+            return None
+        if thread['missing']:
+            print(f"Warning: tweets {', '.join(map(str, thread['missing']))} are missing")
+        return thread
+    
+    def _outline(self, topic: str, num_tweets: int) -> Optional[Dict[int, str]]:
+        """Ask for one line per tweet; returns {number: point} or None"""
+        prompt = self._create_outline_prompt(topic, num_tweets)
+        response = self.ai_provider.generate_completion(
+            prompt, max_tokens=OUTLINE_TOKENS_PER_TWEET * num_tweets + 100
+        )
+        outline = {}
+        for match in OUTLINE_LINE.finditer(response or ''):
+            number = int(match.group(1))
+            if 1 <= number <= num_tweets and number not in outline:
+                outline[number] = match.group(2)
+        
+        # Fewer than half the points means the model didn't follow the format
+        if len(outline) * 2 < num_tweets:
+            print("\n=== Raw outline ===")
+            print(response)
+            print("===================\n")
+            if hasattr(self.ai_provider, "invalidate"):
+                self.ai_provider.invalidate(prompt, max_tokens=OUTLINE_TOKENS_PER_TWEET * num_tweets + 100)
+            return None
+        return outline
+    
+    def _expand_tweet(self, topic: str, outline: Dict[int, str], number: int,
+                      total: int) -> Optional[Tuple[str, str]]:
+        """Write tweet ``number`` from the outline; returns (tweet, image query) or None"""
+        prompt = self._create_expand_prompt(topic, outline, number, total)
+        response = self.ai_provider.generate_completion(prompt, max_tokens=EXPAND_TOKENS)
+        body = (response or '').strip()
+        # Number the tweet ourselves whether or not the model did
+        marker = TWEET_MARKER.match(body)
+        if marker:
+            body = body[marker.end():]
+        thread = parse_thread_text(f"{number}/{total} {body}", expected=total)
+        if thread['numbers'][:1] != [number]:
+            if hasattr(self.ai_provider, "invalidate"):
+                self.ai_provider.invalidate(prompt, max_tokens=EXPAND_TOKENS)
+            return None
+        return thread['tweets'][0], thread['image_queries'][0]
+    
+    def _create_outline_prompt(self, topic: str, num_tweets: int) -> str:
+        return f"""Plan an engaging Twitter thread about {topic} with {num_tweets} tweets.
+                  Reply with exactly {num_tweets} numbered lines ("1. ...", "2. ..."), one short line per tweet saying what it covers, and nothing else.
+                  - Line 1 is the hook: the most interesting fact, a question or a statement that makes the reader want to read the rest
+                  - Cover any interesting fact or story about the topic, and an upcoming popular event or occasion if there is one
+                  - Make sure any factual information is accurate
+                  - The last line is a call to action
+                  """
+    
+    def _create_expand_prompt(self, topic: str, outline: Dict[int, str], number: int, total: int) -> str:
+        plan = "\n".join(f"{n}. {outline.get(n, '(fits between its neighbours)')}" for n in range(1, total + 1))
+        point = outline.get(number, "whatever fits between the tweets around it")
+        return f"""We are writing a Twitter thread about {topic} with {total} tweets, following this outline:
+{plan}
+
+Write only tweet {number}/{total}, covering: {point}
+Requirements:
+- Start with "{number}/{total}" and keep it under {MAX_TWEET_LENGTH} characters including the number
+- End with an image description in [IMG: description] format. The image should be likely to exist on the internet; prefer real people and real events over stock type images, and give a person's name and surname
+- Make it informative and engaging, make sure any factual information is accurate, and use emojis appropriately
+"""
+    
+    def repair_thread(self, topic: str, thread: Dict) -> Dict:
+        """Re-prompt only for the missing and over-length tweets of ``thread``
+        
+        The follow-up prompt shows the neighbouring tweets for context and asks
+        for just the broken numbers; usable answers are merged back in place.
+        Returns the merged thread, or ``thread`` unchanged if nothing needed or
+        survived repair.
+        """
+        total = thread.get('expected') or len(thread['tweets'])
+        numbers = thread.get('numbers') or list(range(1, len(thread['tweets']) + 1))
+        by_number = dict(zip(numbers, zip(thread['tweets'], thread['image_queries'])))
+        too_long = over_length(thread)
+        targets = sorted(set(thread.get('missing', [])) | set(too_long))
+        if not targets:
+            return thread
+        if self.topic_budget(topic) <= 0:
+            print(f"✗ This topic already used its {self.topic_max_calls} completions, not repairing")
+            return thread
+        self._charge(topic)
+        
+        print(f"Repairing tweets {', '.join(map(str, targets))} of {total}")
+        prompt = self._create_repair_prompt(topic, total, by_number, targets, too_long)
+        try:
+            self.ai_provider.start()
+            response = self.ai_provider.generate_completion(prompt)
         finally:
             self.ai_provider.close()
+        
+        repaired = parse_thread_text(response, expected=total)
+        fixed = []
+        for number, tweet, image_query in zip(repaired['numbers'], repaired['tweets'], repaired['image_queries']):
+            if number not in targets or tweet_length(tweet) > MAX_TWEET_LENGTH:
+                continue
+            # Keep the old image query if the repair didn't bring one
+            previous_query = by_number.get(number, ('', ''))[1]
+            by_number[number] = (tweet, image_query or previous_query)
+            fixed.append(number)
+        
+        if not fixed:
+            print("Repair didn't produce usable tweets, keeping the thread as it was")
+            if hasattr(self.ai_provider, "invalidate"):
+                self.ai_provider.invalidate(prompt)
+            return thread
+        
+        merged_numbers = sorted(by_number)
+        merged = {
+            'tweets': [by_number[n][0] for n in merged_numbers],
+            'image_queries': [by_number[n][1] for n in merged_numbers],
+            'numbers': merged_numbers,
+            'expected': total,
+            'missing': [n for n in range(1, total + 1) if n not in by_number]
+        }
+        still_broken = sorted(set(merged['missing']) | set(over_length(merged)))
+        print(f"Repaired tweets {', '.join(map(str, fixed))}"
+              + (f"; still broken: {', '.join(map(str, still_broken))}" if still_broken else ""))
+        return merged
+    
+    def _create_repair_prompt(self, topic: str, total: int, by_number: Dict[int, Tuple[str, str]],
+                              targets: List[int], too_long: List[int]) -> str:
+        """Follow-up prompt asking only for ``targets``, with their neighbours as context"""
+        context = sorted({
+            n for target in targets for n in (target - 1, target + 1)
+            if n in by_number and n not in targets
+        })
+        lines = [f"We are writing a Twitter thread about {topic} with {total} tweets."]
+        if context:
+            lines.append("These neighbouring tweets are already written:")
+            lines.extend(f"{by_number[n][0]} [IMG: {by_number[n][1]}]" for n in context)
+        for target in targets:
+            if target in too_long:
+                lines.append(f"Tweet {target}/{total} is too long ({tweet_length(by_number[target][0])} "
+                             f"characters), rewrite it shorter: {by_number[target][0]}")
+            else:
+                lines.append(f"Tweet {target}/{total} is missing, write it so it fits between its neighbours.")
+        lines.append(
+            f"Reply with only tweets {', '.join(f'{n}/{total}' for n in targets)}, each starting with its number, "
+            f"under {MAX_TWEET_LENGTH} characters including the number, and ending with an "
+            "[IMG: description] of a real photo that is likely to exist on the internet."
+        )
+        return "\n".join(lines)
+    
+    def _create_json_prompt(self, topic: str, num_tweets: int) -> str:
+        """Prompt for JSON mode; the response schema carries the structure"""
+        return f"""Create an engaging Twitter thread about {topic} with exactly {num_tweets} tweets.
+                  Reply with JSON only: {{"tweets": [{{"text": "...", "image_query": "..."}}]}}
+                  Requirements:
+                  - "text" is the tweet without its number, at most {tweet_text_limit(num_tweets)} characters
+                  - "image_query" describes an image that is likely to exist on the internet. We can not afford to photoshop images. If its regarding a particular person then put his name and surname as well. Avoid stock type images, prefer real people and real events that happened in the past
+                  - The first tweet should be a hook that makes the reader want to read the rest of the thread
+                  - Make the thread informative and engaging, and make sure any factual information is accurate
+                  - If there is an interesting fact or story about the topic we should mention it
+                  - Use emojis appropriately
+                  - End with a call to action
+                  - If there is an upcoming event or occasion regarding this topic that is popular then mention it
+                  """
     
     def _create_prompt(self, topic: str, num_tweets: int) -> str:
         """Create the prompt for the AI provider"""
@@ -36,69 +683,89 @@ class ThreadGenerator:
                   - If there is an upcoming event or occasion regarding this topic that is popular then mention it
                   """
     
-    def _parse_thread(self, response: str) -> Dict[str, List[str]]:
-        """Process a single tweet's lines into tweet text and image query"""
+    def _parse_thread(self, response: str, expected: Optional[int] = None,
+                      structured: bool = False) -> Optional[Dict]:
+        """Parse the raw response; partial threads are returned with their ``missing`` numbers"""
         # Print the raw response first
         print("\n=== Raw AI Response ===")
         print(response)
         print("=====================\n")
         
-        tweets = []
-        image_queries = []
-        
-        lines = response.split('\n')
-        current_tweet = []
-        expected_count = None
-        
-        # Print each line as we process it
+        thread = parse_thread_json(response, expected) if structured else None
+        if structured and thread is None:
+            print("Response isn't a JSON thread, falling back to the text parser")
+        if thread is None:
+            thread = parse_thread_text(response, expected)
+        print(f"Processed {len(thread['tweets'])} of {thread['expected']} tweets")
+        if not thread['tweets']:
+            return None
+        if thread['missing']:
+            print(f"Warning: tweets {', '.join(map(str, thread['missing']))} are missing")
+        return thread
+
+
+class ThreadStreamParser:
+    """Incrementally split a streamed completion into tweets
+    
+    Uses the same marker and [IMG: ...] rules as parse_thread_text.
+    """
+    
+    def __init__(self, generator: ThreadGenerator, expected: Optional[int] = None):
+        self.generator = generator
+        self.sequence = MarkerSequence(expected)
+        self.tweets = []
+        self.image_queries = []
+        self._buffer = ""
+        self._current = []
+        self._marker = None
+        self._emitted = False
+    
+    def feed(self, chunk: str) -> List[Tuple[int, str, str]]:
+        """Add a chunk of text and return any tweets it completed"""
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split('\n')
+        finished = []
         for line in lines:
-            if not line.strip():
-                continue
-            
-            # Extract expected tweet count from first tweet
-            if not expected_count and '1/' in line:
-                try:
-                    expected_count = int(line.split('/')[1].split()[0])
-                    print(f"Expected tweet count: {expected_count}")
-                except:
-                    expected_count = 10  # Default
-            
-            # Check if this is a new tweet
-            if any(f"{i}/" in line.strip() for i in range(1, 11)):
-                if current_tweet:
-                    self._process_tweet(current_tweet, tweets, image_queries)
-                current_tweet = [line]
-                print(f"Found tweet marker: {line}")
-            else:
-                current_tweet.append(line)
-        
-        # Process the last tweet
-        if current_tweet:
-            self._process_tweet(current_tweet, tweets, image_queries)
-        
-        # Print final count
-        print(f"\nProcessed {len(tweets)} tweets")
+            finished.extend(self._add_line(line))
+        return finished
+    
+    def finish(self) -> List[Tuple[int, str, str]]:
+        """Flush whatever is left once the stream has ended"""
+        finished = []
+        if self._buffer:
+            finished.extend(self._add_line(self._buffer))
+            self._buffer = ""
+        finished.extend(self._flush())
+        return finished
+    
+    def _add_line(self, line: str) -> List[Tuple[int, str, str]]:
+        if not line.strip():
+            return []
         
-        # Verify we got all expected tweets
-        if expected_count and len(tweets) < expected_count:
-            print(f"Warning: Expected {expected_count} tweets but only got {len(tweets)}")
-            return None
+        finished = []
+        marker = TWEET_MARKER.match(line)
+        if marker and self.sequence.accept(int(marker.group(1)), marker.group(2)):
+            finished.extend(self._flush())
+            self._marker = marker
+            self._current = [line[marker.end():]]
+            self._emitted = False
+        elif self._current and not self._emitted and not SEPARATOR_LINE.match(line):
+            self._current.append(line)
         
-        return {
-            'tweets': tweets,
-            'image_queries': image_queries
-        }
+        # A closed image tag means this tweet won't change any more
+        if not self._emitted and self._current and IMG_TAG.search('\n'.join(self._current)):
+            finished.extend(self._flush())
+        return finished
     
-    def _process_tweet(self, tweet_lines: List[str], tweets: List[str], image_queries: List[str]):
-        """Process a single tweet's lines into tweet text and image query"""
-        tweet_text = ' '.join(tweet_lines)
+    def _flush(self) -> List[Tuple[int, str, str]]:
+        if not self._current or self._emitted:
+            return []
         
-        # Extract image description
-        img_start = tweet_text.find('[IMG:')
-        if img_start != -1:
-            img_end = tweet_text.find(']', img_start)
-            image_query = tweet_text[img_start+5:img_end].strip()
-            tweet_text = tweet_text[:img_start].strip()
-            
-            tweets.append(tweet_text)
-            image_queries.append(image_query) 
\ No newline at end of file
+        self._emitted = True
+        text, image_query = split_tweet(self._marker, '\n'.join(self._current))
+        if not text:
+            return []
+        self.tweets.append(text)
+        self.image_queries.append(image_query)
+        index = len(self.tweets) - 1
+        return [(index, text, image_query)]
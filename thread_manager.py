@@ -1,15 +1,20 @@
 from thread_generator import ThreadGenerator
 from find_photo import GoogleImageFinder
 from tweet import XAutomation
+from page_pool import PagePool
 from datetime import datetime
 import os
 import webbrowser
 import time
 
 class ThreadManager:
-    def __init__(self):
+    def __init__(self, image_concurrency=None, image_query_timeout=None):
         self.generator = ThreadGenerator()
         self.x_bot = XAutomation()
+        # Number of image searches/downloads run in parallel (1 = one at a time)
+        self.image_concurrency = image_concurrency or int(os.getenv("IMAGE_CONCURRENCY", "4"))
+        self.image_query_timeout = image_query_timeout or int(os.getenv("IMAGE_QUERY_TIMEOUT", "30"))
+        self.image_pages = None
         
     def create_and_post_thread(self, topic):
         auto_confirm = input("Auto-confirm all images? (y/n): ").lower() == 'y'
@@ -18,16 +23,25 @@ class ThreadManager:
     def _create_and_post_thread(self, topic, auto_confirm_images=False):
         """Main workflow to generate and post a thread"""
         try:
+            # Start the browser first so image searches can run while the thread is written
+            self.x_bot.start()
+            
             # 1. Generate thread content
             print(f"Generating thread about: {topic}")
-            thread_data = self.generator.generate_thread(topic)
+            thread_data = self._generate_with_prefetch(topic)
             
             # Check if thread generation was successful
             if thread_data is None:
-                print("Thread generation failed - incomplete thread detected")
+                print("Thread generation failed - no tweets could be parsed")
                 if self._get_retry_confirmation():
+                    self.x_bot.close()
                     return self.create_and_post_thread(topic)
                 return
+            # Ask only for the missing or too long tweets instead of a whole new thread
+            thread_data = self.generator.repair_thread(topic, thread_data)
+            if thread_data['missing']:
+                # Keep what was parsed; the preview lets the user fill the gaps
+                print(f"Keeping the {len(thread_data['tweets'])} tweets that were parsed")
             
             # Save thread to markdown and get user confirmation/edits
             thread_dir = self._save_thread_preview(topic, thread_data)
@@ -37,9 +51,6 @@ class ThreadManager:
             # Load potentially edited thread data
             thread_data = self._load_thread_from_markdown(thread_dir)
             
-            # Start the browser session first
-            self.x_bot.start()
-            
             # Now pass the browser instance to handle images
             image_paths = self._handle_images(thread_data, self.x_bot.browser, auto_confirm_images)
             if not image_paths:
@@ -49,7 +60,8 @@ class ThreadManager:
             print("Posting thread...")
             self.x_bot.post_thread(
                 tweets=thread_data['tweets'],
-                image_paths=image_paths
+                image_paths=image_paths,
+                thread_dir=thread_data['thread_dir']
             )
             
         except Exception as e:
@@ -57,10 +69,53 @@ class ThreadManager:
         finally:
             self.x_bot.close()
     
+    def _generate_with_prefetch(self, topic):
+        """Generate the thread, searching for each tweet's image as soon as it arrives
+        
+        The searches run on the warm image pages of the posting browser and only
+        fill the image search cache, so the image step later finds unedited
+        queries without searching again. The model keeps writing the rest of
+        the thread while a search runs.
+        """
+        finder = GoogleImageFinder(
+            browser=self.x_bot.browser,
+            page_pool=self._image_page_pool(self.x_bot.browser),
+            router=self.x_bot.router
+        )
+        prefetched = []
+        
+        def on_tweet(index, tweet, image_query):
+            if not image_query:
+                return
+            # Playwright pages belong to this thread, so search right here between stream chunks
+            try:
+                found = finder.search_images([image_query], max_concurrency=1,
+                                             query_timeout=self.image_query_timeout)[0]
+            except Exception as e:
+                print(f"Early image search failed for tweet {index+1}: {e}")
+                found = []
+            prefetched.append(bool(found))
+        
+        try:
+            return self.generator.generate_thread(topic, on_tweet=on_tweet)
+        finally:
+            finder.close()
+            if prefetched:
+                print(f"Found images for {sum(prefetched)} of {len(prefetched)} tweets while generating")
+    
     def _save_thread_preview(self, topic, thread_data):
         """Save thread to markdown file and create images directory"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         thread_dir = f"threads/thread_{timestamp}"
+        # Batch workers can save several threads within the same second
+        suffix = 1
+        while True:
+            try:
+                os.makedirs(thread_dir)
+                break
+            except FileExistsError:
+                suffix += 1
+                thread_dir = f"threads/thread_{timestamp}_{suffix}"
         os.makedirs(f"{thread_dir}/images", exist_ok=True)
         
         filename = f"{thread_dir}/thread.md"
@@ -115,12 +170,12 @@ class ThreadManager:
             tweets.append(section[tweet_start:tweet_end].strip())
             
             # Extract image query
-            query_start = section.find('**Image Query:**') + 15
+            query_start = section.find('**Image Query:**') + len('**Image Query:**')
             query_end = section.find('\n', query_start)
             image_queries.append(section[query_start:query_end].strip())
             
             # Extract custom URL if provided
-            url_start = section.find('**Custom Image URL:**') + 19
+            url_start = section.find('**Custom Image URL:**') + len('**Custom Image URL:**')
             url_end = section.find('\n', url_start) if section.find('\n', url_start) != -1 else len(section)
             custom_url = section[url_start:url_end].strip()
             # Only add URL if it's not empty and not just markdown formatting
@@ -136,18 +191,54 @@ class ThreadManager:
             'thread_dir': thread_dir
         }
     
+    def close(self):
+        """Shut down the browser kept alive between threads (X_KEEP_BROWSER=1)"""
+        self.x_bot.shutdown()
+    
+    def _image_page_pool(self, browser):
+        """Warm Google Images pages in the posting browser, kept while it lives"""
+        if self.image_pages is None or self.image_pages.context is not browser:
+            self.image_pages = PagePool(
+                browser,
+                size=self.image_concurrency,
+                warm_url="https://www.google.com/imghp"
+            )
+        return self.image_pages
+    
     def _handle_images(self, thread_data, browser, auto_confirm_images=False):
-        finder = GoogleImageFinder(browser=browser)
+        finder = GoogleImageFinder(
+            browser=browser,
+            page_pool=self._image_page_pool(browser),
+            router=self.x_bot.router
+        )
         finder.start()
         final_paths = []
+        concurrent = self.image_concurrency > 1
         
         try:
+            prefetched = [None] * len(thread_data['image_queries'])
+            if concurrent:
+                # Search and download every non-custom image up front, in parallel
+                print(f"\nSearching for {len(prefetched)} images "
+                      f"({self.image_concurrency} at a time)...")
+                prefetched = finder.fetch_images(
+                    [None if custom_url and custom_url.strip() else query
+                     for query, custom_url in zip(
+                         thread_data['image_queries'],
+                         thread_data['custom_urls']
+                     )],
+                    output_dir=os.path.join(thread_data['thread_dir'], 'images'),
+                    max_concurrency=self.image_concurrency,
+                    query_timeout=self.image_query_timeout
+                )
+            
             for i, (query, custom_url) in enumerate(zip(
                 thread_data['image_queries'], 
                 thread_data['custom_urls']
             )):
                 images_dir = os.path.join(thread_data['thread_dir'], 'images')
                 current_path = None
+                searches = finder.network_searches
                 
                 # Initial image download (either custom URL or search)
                 if custom_url and custom_url.strip():
@@ -158,7 +249,11 @@ class ThreadManager:
                         output_dir=images_dir
                     )
                 
-                if not current_path:
+                # Already searched in parallel above (custom URLs were skipped)
+                searched = concurrent and not (custom_url and custom_url.strip())
+                if not current_path and searched:
+                    current_path = prefetched[i]
+                elif not current_path and query:
                     print(f"\nSearching for image {i+1}: {query}")
                     try:
                         current_path = self._try_image_search(finder, query, i, thread_data['thread_dir'])
@@ -206,13 +301,38 @@ class ThreadManager:
                         print("Failed to download image. Try another URL or press Enter to skip.")
                         current_path = None
                 
-                time.sleep(2)
+                # Throttle sequential searches, but not answers from the search cache
+                if not concurrent and finder.network_searches > searches:
+                    time.sleep(2)
             
             return final_paths
                 
         finally:
             finder.close()
     
+    def collect_images(self, thread_data, finder):
+        """Fetch every image without prompting (batch mode)
+        
+        Custom URLs are downloaded as-is and the rest are searched. The returned
+        list is aligned with the tweets and holds None where nothing was found.
+        """
+        images_dir = os.path.join(thread_data['thread_dir'], 'images')
+        custom_urls = [url.strip() if url and url.strip() else None for url in thread_data['custom_urls']]
+        paths = finder.fetch_images(
+            [None if url else query for query, url in zip(thread_data['image_queries'], custom_urls)],
+            output_dir=images_dir,
+            max_concurrency=self.image_concurrency,
+            query_timeout=self.image_query_timeout
+        )
+        for i, url in enumerate(custom_urls):
+            if url:
+                paths[i] = finder.download_single_image(
+                    url=url,
+                    filename_base=f"tweet_{i}",
+                    output_dir=images_dir
+                )
+        return paths
+    
     def _confirm_image(self, tweet_num):
         return input(f"\nUse this image for tweet {tweet_num}? (y/n): ").lower() == 'y'
 
@@ -226,44 +346,50 @@ class ThreadManager:
     def _try_image_search(self, finder, query, index, thread_dir):
         """Try to find and download an image using the search query"""
         try:
-            url = finder.search_image(query)
-            if url and not url.startswith('data:'):
-                images_dir = os.path.join(thread_dir, 'images')
-                return finder.download_single_image(
-                    url=url,
-                    filename_base=f"tweet_{index}",
-                    output_dir=images_dir
-                )
+            images_dir = os.path.join(thread_dir, 'images')
+            return finder.download_best_image(
+                query,
+                filename_base=f"tweet_{index}",
+                output_dir=images_dir
+            )
         except Exception as e:
             print(f"Error during image search: {e}")
         return None
 
+    def load_existing_thread(self, folder_name):
+        """Load a saved thread folder; returns (thread_data, image_files)"""
+        # Construct the full path
+        thread_dir = os.path.join("threads", folder_name)
+        thread_file = os.path.join(thread_dir, "thread.md")
+        
+        # Verify the folder and file exist
+        if not os.path.exists(thread_file):
+            raise FileNotFoundError(f"Thread file not found at {thread_file}")
+        
+        # Load thread data from markdown
+        thread_data = self._load_thread_from_markdown(thread_dir)
+        
+        # Get list of image files
+        image_dir = os.path.join(thread_dir, "images")
+        if os.path.exists(image_dir):
+            image_files = sorted([
+                os.path.join(image_dir, f) 
+                for f in os.listdir(image_dir) 
+                if f.startswith("tweet_")
+            ])
+        else:
+            image_files = []
+        return thread_data, image_files
+    
     def post_existing_thread(self, folder_name):
         """Post a thread from an existing folder"""
         try:
-            # Construct the full path
-            thread_dir = os.path.join("threads", folder_name)
-            thread_file = os.path.join(thread_dir, "thread.md")
-            
-            # Verify the folder and file exist
-            if not os.path.exists(thread_file):
-                print(f"Error: Thread file not found at {thread_file}")
+            try:
+                thread_data, image_files = self.load_existing_thread(folder_name)
+            except FileNotFoundError as e:
+                print(f"Error: {e}")
                 return
             
-            # Load thread data from markdown
-            thread_data = self._load_thread_from_markdown(thread_dir)
-            
-            # Get list of image files
-            image_dir = os.path.join(thread_dir, "images")
-            if os.path.exists(image_dir):
-                image_files = sorted([
-                    os.path.join(image_dir, f) 
-                    for f in os.listdir(image_dir) 
-                    if f.startswith("tweet_")
-                ])
-            else:
-                image_files = []
-            
             # Start the browser session
             self.x_bot.start()
             
@@ -271,7 +397,8 @@ class ThreadManager:
             print("Posting thread...")
             self.x_bot.post_thread(
                 tweets=thread_data['tweets'],
-                image_paths=image_files
+                image_paths=image_files,
+                thread_dir=thread_data['thread_dir']
             )
             
             print("Thread posted successfully!")
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+
+PROGRESS_FILE = "progress.json"
+POSTED_FILE = "posted.json"
+
+
+def _fingerprint(text):
+    return hashlib.sha256(text.strip().encode('utf-8')).hexdigest()[:16]
+
+
+class ThreadProgress:
+    """Per-tweet posting checkpoints, kept in <thread_dir>/progress.json
+
+    ``posted`` counts the tweets X has accepted and ``tweets`` holds their ids
+    and URLs in order, so a later run can continue the thread by replying to
+    the newest one.
+    ``filled``/``uploaded`` record what the open composer already holds; they are
+    only trusted after checking the composer still shows them. ``submitted`` is
+    set while a post is in flight, so an unconfirmed post is never blindly
+    repeated. Without a thread_dir the checkpoints only live for one call.
+    """
+
+    def __init__(self, tweets, thread_dir=None):
+        self.path = os.path.join(thread_dir, PROGRESS_FILE) if thread_dir else None
+        self.fingerprints = [_fingerprint(tweet) for tweet in tweets]
+        self.posted = 0
+        self.tweets = []
+        self.filled = set()
+        self.uploaded = set()
+        self.submitted = False
+        self._load()
+
+    @property
+    def last_url(self):
+        return self.tweets[-1]['url'] if self.tweets else None
+
+    @property
+    def done(self):
+        return self.posted >= len(self.fingerprints)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable {self.path}: {e}")
+            return
+        posted = saved.get('posted', 0)
+        # Only trust the checkpoint if the already posted tweets weren't edited since
+        if saved.get('fingerprints', [])[:posted] != self.fingerprints[:posted]:
+            print(f"⚠️ {self.path} doesn't match the thread anymore, starting over")
+            return
+        self.posted = posted
+        self.tweets = saved.get('tweets', [])[:posted]
+        self.filled = set(saved.get('filled', []))
+        self.uploaded = set(saved.get('uploaded', []))
+        self.submitted = saved.get('submitted', False)
+
+    def save(self):
+        if not self.path:
+            return
+        state = {
+            'posted': self.posted,
+            'total': len(self.fingerprints),
+            'tweets': self.tweets,
+            'filled': sorted(self.filled),
+            'uploaded': sorted(self.uploaded),
+            'submitted': self.submitted,
+            'fingerprints': self.fingerprints,
+            'updated': datetime.now().isoformat(timespec='seconds')
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def mark_filled(self, index, uploaded=False):
+        self.filled.add(index)
+        if uploaded:
+            self.uploaded.add(index)
+        self.save()
+
+    def mark_submitted(self, in_flight=True):
+        """Record whether a post of the filled tweets may be in flight"""
+        self.submitted = in_flight
+        self.save()
+
+    def reset_composer(self):
+        """Forget composer checkpoints once the composer they described is gone"""
+        self.filled = set()
+        self.uploaded = set()
+        self.submitted = False
+        self.save()
+
+    def mark_posted(self, tweets):
+        """Record newly confirmed tweets, as {'id', 'url'} dicts in thread order"""
+        if not tweets:
+            return
+        for tweet in tweets:
+            self.tweets.append({'index': self.posted, **tweet})
+            self.posted += 1
+        self.filled = set()
+        self.uploaded = set()
+        self.submitted = False
+        self.save()
+
+    def result(self, thread=None):
+        """Structured outcome of posting, as written to posted.json"""
+        return {
+            'status': 'posted' if self.done else 'partial',
+            'posted': self.posted,
+            'total': len(self.fingerprints),
+            'thread_url': self.tweets[0]['url'] if self.tweets else None,
+            'tweets': [
+                {**tweet, 'text': thread[tweet['index']]} if thread else dict(tweet)
+                for tweet in self.tweets
+            ],
+            'posted_at': datetime.now().isoformat(timespec='seconds')
+        }
+
+    def write_result(self, thread=None):
+        """Write result() to <thread_dir>/posted.json and return it"""
+        result = self.result(thread)
+        if self.path:
+            with open(os.path.join(os.path.dirname(self.path), POSTED_FILE), 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+        return result
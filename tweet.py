@@ -1,60 +1,163 @@
 from playwright.sync_api import sync_playwright
 import time
-import random
 import os
-import tempfile
-import requests
+import re
 from urllib.parse import urlparse
 from pathlib import Path
 from find_photo import GoogleImageFinder
+from media_store import MediaStore
+from thread_progress import ThreadProgress
+from post_capture import PostCapture, PostRejected
+import browser_service
+from page_pool import PagePool
+from resource_blocking import install_router
+import browser_config
 from datetime import datetime
 import sys
 # from thread_manager import ThreadManager
 
+HOME_URL = 'https://twitter.com/home'
+FILE_INPUT = 'input[accept="image/jpeg,image/png,image/webp,image/gif,video/mp4,video/quicktime"]'
+OVERLAY_SELECTORS = [
+    'div[role="listbox"]',
+    'div[data-testid="typeaheadDropdown"]',
+    'div[data-testid="typeaheadOverlay"]',
+    'div[role="menu"]'
+]
+# Post buttons only count as ready once X drops aria-disabled
+POST_BUTTON_SELECTORS = [
+    'div[data-testid="tweetButtonInline"]:not([aria-disabled="true"])',
+    'div[data-testid="tweetButton"]:not([aria-disabled="true"])',
+    'button[data-testid="tweetButtonInline"]:not([aria-disabled="true"])',
+    'button[data-testid="tweetButton"]:not([aria-disabled="true"])'
+]
+
 class XAutomation:
-    def __init__(self, user_data_dir="./chrome-data"):
+    def __init__(self, user_data_dir="./chrome-data", step_timeout=None, cdp_endpoint=None,
+                 keep_browser=None, headless=None):
         self.playwright = None
         self.browser = None
         self.page = None
         self.user_data_dir = user_data_dir
+        # Attach to a running browser_service instead of launching Chromium
+        self.cdp_endpoint = cdp_endpoint or browser_service.cdp_endpoint()
+        self._cdp_browser = None
+        # Keep the browser and its warm pages between jobs; close() just returns the page
+        if keep_browser is None:
+            keep_browser = os.getenv("X_KEEP_BROWSER", "0") == "1"
+        self.keep_browser = keep_browser
+        self.page_pool = None
+        self.router = None
+        self.headless = browser_config.headless(headless)
+        # Timeout (ms) for each readiness wait while composing
+        self.step_timeout = step_timeout or int(os.getenv("X_STEP_TIMEOUT", "15000"))
+        self.step_latencies = []
+        self.media_store = None
+        # Attempts per post_thread() call; later attempts resume from the checkpoints
+        self.post_attempts = int(os.getenv("X_POST_ATTEMPTS", "3"))
+        # X accepts at most 25 tweets per composer, longer threads are posted in parts
+        self.thread_chunk = int(os.getenv("X_THREAD_CHUNK", "25"))
+        # CSS prefix for the composer in use: '' for home, the dialog when replying
+        self._scope = ''
 
     def start(self):
         """Initialize the browser"""
+        if self.browser:
+            # Still running from a previous job: just lease a warm page
+            try:
+                self.page = self.page_pool.acquire()
+                return
+            except Exception as e:
+                print(f"Kept browser is gone ({e}), starting a new one")
+                self.shutdown()
+        
         self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch_persistent_context(
-            user_data_dir=self.user_data_dir,
-            headless=False
+        if self.cdp_endpoint and browser_service.is_healthy(self.cdp_endpoint):
+            print(f"Attaching to browser service at {self.cdp_endpoint}")
+            self._cdp_browser, self.browser = browser_service.connect(self.playwright, self.cdp_endpoint)
+        else:
+            if self.cdp_endpoint:
+                print(f"Browser service at {self.cdp_endpoint} is not responding, launching Chromium")
+            self.browser = self.playwright.chromium.launch_persistent_context(
+                user_data_dir=self.user_data_dir,
+                **browser_config.launch_options(self.headless),
+                **browser_config.context_options()
+            )
+        self.router = install_router(self.browser)
+        self.page_pool = PagePool(
+            self.browser,
+            size=int(os.getenv("X_PAGE_POOL_SIZE", "2")),
+            warm_url=HOME_URL
+        )
+        self.page = self.page_pool.acquire()
+        self._wait_step(
+            "home composer ready",
+            lambda timeout: self.page.wait_for_selector('[data-testid="tweetTextarea_0"]', timeout=timeout)
+        )
+
+    def _wait_step(self, name, wait, timeout=None):
+        """Run a readiness wait with a timeout and record how long it took"""
+        start = time.perf_counter()
+        try:
+            return wait(timeout or self.step_timeout)
+        finally:
+            self.step_latencies.append((name, time.perf_counter() - start))
+
+    def latency_report(self):
+        """Print per-step wait latencies and return them as (name, seconds) pairs"""
+        if not self.step_latencies:
+            return []
+        print("\n=== Step latencies ===")
+        for name, seconds in self.step_latencies:
+            print(f"{seconds * 1000:8.0f} ms  {name}")
+        total = sum(seconds for _, seconds in self.step_latencies)
+        print(f"{total * 1000:8.0f} ms  total waiting")
+        print("======================\n")
+        return list(self.step_latencies)
+
+    def _wait_for_post_button(self, timeout):
+        """Wait until any Post button is enabled and return its locator"""
+        return self._wait_for_any(POST_BUTTON_SELECTORS, timeout)
+
+    def _wait_for_any(self, selectors, timeout):
+        """Wait until the first of several selectors is visible"""
+        locator = self.page.locator(', '.join(selectors)).first
+        locator.wait_for(state='visible', timeout=timeout)
+        return locator
+
+    def _wait_for_attachments(self, count, timeout):
+        """Wait until ``count`` media previews have rendered in the composer"""
+        self.page.wait_for_function(
+            """n => document.querySelectorAll('[data-testid="attachments"] img, '
+                + '[data-testid="attachments"] video').length >= n""",
+            arg=count,
+            timeout=timeout
         )
-        self.page = self.browser.new_page()
-        self.page.goto('https://twitter.com/home')
-        time.sleep(2)
 
     def post_tweet(self, text):
+        """Post a single tweet; returns {'id', 'url'} once X confirms it, else None"""
         try:
             # Fill tweet text directly in the "What is happening?!" field
             self.page.fill('div[role="textbox"]', text)
-            time.sleep(random.uniform(1, 2))
             
-            # Try multiple selectors for the Post button
             try:
-                # First attempt with the most specific selector
-                self.page.click('div[data-testid="tweetButtonInline"]', timeout=3000)
-            except:
-                try:
-                    # Second attempt with the text content
-                    self.page.click('text="Post"', timeout=3000)
-                except:
-                    try:
-                        # Third attempt with a different testid
-                        self.page.click('div[data-testid="tweetButton"]', timeout=3000)
-                    except Exception as e:
-                        print(f"Could not find the Post button. Error: {e}")
-                        return
+                post_button = self._wait_step("post button enabled", self._wait_for_post_button)
+            except Exception as e:
+                print(f"Could not find the Post button. Error: {e}")
+                return None
             
-            print("Tweet posted successfully!")
-            time.sleep(3)
+            tweet = self._click_and_confirm(post_button)
+            print(f"Tweet posted successfully! {tweet['url']}")
+            return tweet
         except Exception as e:
             print(f"Error posting tweet: {e}")
+            return None
+
+    def _click_and_confirm(self, post_button):
+        """Click Post and wait for X's CreateTweet answer instead of watching the UI"""
+        with PostCapture(self.page) as capture:
+            post_button.click()
+            return self._wait_step("post confirmed", lambda timeout: capture.wait(1, timeout))[0]
 
     def _is_url(self, path):
         """Check if the given path is a URL."""
@@ -64,122 +167,70 @@ class XAutomation:
         except:
             return False
 
-    def _download_image(self, url):
-        """Download image from URL to a temporary file with proper headers."""
-        try:
-            # Set up headers to mimic a browser request
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive'
-            }
-            
-            # Make request with headers and timeout
-            response = requests.get(
-                url, 
-                headers=headers, 
-                stream=True, 
-                timeout=10,
-                verify=True
-            )
-            response.raise_for_status()
-            
-            # Map content types to extensions
-            extensions = {
-                'image/jpeg': '.jpg',
-                'image/png': '.png',
-                'image/gif': '.gif',
-                'image/webp': '.webp'
-            }
-            content_type = response.headers.get('content-type', '').lower()
-            ext = extensions.get(content_type, '.jpg')
-            
-            # Create temporary file
-            temp_file = tempfile.NamedTemporaryFile(suffix=ext, delete=False)
-            
-            # Download in chunks
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    temp_file.write(chunk)
-            temp_file.close()
-            
-            return temp_file.name
-            
-        except Exception as e:
-            print(f"Error downloading image: {e}")
-            return None
-
     def post_tweet_with_image(self, text, image_path):
         """
         Post a tweet with an image. The image_path can be either:
         - A local file path
         - A URL to an image
+        Returns {'id', 'url'} once X confirms the post, else None.
         """
         try:
-            temp_file = None
-            
-            # If it's a URL, download it first
+            # If it's a URL, download it first (or reuse the stored copy)
             if self._is_url(image_path):
-                temp_file = self._download_image(image_path)
-                if not temp_file:
+                if not self.media_store:
+                    self.media_store = MediaStore()
+                stored_path = self.media_store.fetch(image_path)
+                if not stored_path:
                     raise Exception("Failed to download image")
-                image_path = temp_file
+                image_path = stored_path
             
             # Fill tweet text
             self.page.fill('div[role="textbox"]', text)
-            time.sleep(1)
             
-            # Upload the image
-            file_input = 'input[accept="image/jpeg,image/png,image/webp,image/gif,video/mp4,video/quicktime"]'
-            self.page.set_input_files(file_input, image_path)
-            time.sleep(3)  # Increased wait time for image upload
+            # Upload the image and wait for its preview to render
+            self.page.set_input_files(FILE_INPUT, image_path)
+            self._wait_step("media preview rendered", lambda timeout: self._wait_for_attachments(1, timeout))
             
-            # Try multiple selectors for the Post button with retries
-            max_retries = 3
-            for _ in range(max_retries):
-                try:
-                    # First attempt with the most specific selector
-                    post_button = self.page.locator('div[data-testid="tweetButtonInline"]')
-                    if post_button.is_enabled():
-                        post_button.click()
-                        break
-                except:
-                    try:
-                        # Second attempt with the text content
-                        post_button = self.page.locator('text="Post"')
-                        if post_button.is_enabled():
-                            post_button.click()
-                            break
-                    except:
-                        try:
-                            # Third attempt with a different testid
-                            post_button = self.page.locator('div[data-testid="tweetButton"]')
-                            if post_button.is_enabled():
-                                post_button.click()
-                                break
-                        except:
-                            time.sleep(1)  # Wait before retry
-            else:
+            # The Post button stays disabled until the upload has been processed
+            try:
+                post_button = self._wait_step("post button enabled", self._wait_for_post_button)
+            except Exception:
                 raise Exception("Could not click the Post button after multiple attempts")
             
-            time.sleep(3)  # Wait for post to complete
-            print("Tweet with image posted successfully!")
+            tweet = self._click_and_confirm(post_button)
+            print(f"Tweet with image posted successfully! {tweet['url']}")
+            return tweet
             
         except Exception as e:
             print(f"Error posting tweet with image: {e}")
-        
-        finally:
-            # Clean up temporary file if we created one
-            if temp_file and os.path.exists(temp_file):
-                os.unlink(temp_file)
+            return None
 
     def close(self):
+        """Return the page to the pool and, unless keep_browser is set, shut down"""
+        if not self.keep_browser:
+            self.shutdown()
+            return
+        if self.page and self.page_pool:
+            self.page_pool.release(self.page)
+        self.page = None
+
+    def shutdown(self):
         """Close browser and playwright"""
-        if self.browser:
+        if self.page_pool:
+            self.page_pool.close()
+            self.page_pool = None
+        self.router = None
+        if self._cdp_browser:
+            # Disconnect only; the shared browser keeps running
+            self._cdp_browser.close()
+            self._cdp_browser = None
+        elif self.browser:
             self.browser.close()
+        self.browser = None
+        self.page = None
         if self.playwright:
             self.playwright.stop()
+            self.playwright = None
 
     def _has_hashtag(self, text):
         """Check if text contains a hashtag"""
@@ -190,7 +241,7 @@ class XAutomation:
         try:
             # Only press Tab to move focus away
             element.press('Tab')
-            time.sleep(0.5)
+            self._wait_step("hashtag overlay hidden", self._wait_for_overlays_hidden)
         except Exception as e:
             print(f"Error handling hashtag: {e}")
 
@@ -210,31 +261,31 @@ class XAutomation:
         content = ' '.join(words[:-1])  # Get everything except hashtag
         return content, hashtag
 
+    def _wait_for_overlays_hidden(self, timeout):
+        """Wait until no typeahead overlay is visible"""
+        for selector in OVERLAY_SELECTORS:
+            self.page.locator(selector).first.wait_for(state='hidden', timeout=timeout)
+
     def _check_and_dismiss_overlay(self, current_tweet_box=None):
         """Check for hashtag overlay and dismiss it if present"""
         try:
             # Try multiple selectors to find the overlay
-            overlay_selectors = [
-                'div[role="listbox"]',
-                'div[data-testid="typeaheadDropdown"]',
-                'div[data-testid="typeaheadOverlay"]',
-                'div[role="menu"]'
-            ]
-            
-            for selector in overlay_selectors:
+            for selector in OVERLAY_SELECTORS:
                 try:
-                    overlay = self.page.locator(selector)
+                    overlay = self.page.locator(selector).first
                     if overlay.is_visible():
                         print(f"Hashtag overlay detected with selector {selector}, dismissing...")
                         
                         # Click in the thread area to dismiss overlay
                         self.page.click('div[data-testid="cellInnerDiv"]')
-                        time.sleep(0.5)
                         
                         # Verify overlay is gone
-                        if not overlay.is_visible():
-                            print("Overlay dismissed successfully")
-                            return True
+                        self._wait_step(
+                            "overlay detached",
+                            lambda timeout: overlay.wait_for(state='hidden', timeout=timeout)
+                        )
+                        print("Overlay dismissed successfully")
+                        return True
                 except Exception as e:
                     continue
             
@@ -249,122 +300,259 @@ class XAutomation:
         
         # Fill main content first
         element.click()
-        time.sleep(0.5)
+        self._wait_step(
+            "textarea focused",
+            lambda timeout: self.page.wait_for_function(
+                "el => el.contains(document.activeElement)", arg=element, timeout=timeout
+            )
+        )
         
         if hashtag:
             # Fill everything and add a space at the end to dismiss overlay
             full_text = f"{content} {hashtag} "  # Note the extra space at the end
             element.fill(full_text)
-            time.sleep(0.5)
             # Don't remove the space - let it stay to keep overlay dismissed
         else:
             # If no hashtag, just fill the content normally
             element.fill(text)
-            time.sleep(0.5)
+        
+        # Wait for the draft editor to commit the text
+        self._wait_step(
+            "text committed",
+            lambda timeout: self.page.wait_for_function(
+                "el => el.innerText.trim().length > 0", arg=element, timeout=timeout
+            )
+        )
 
-    def post_thread(self, tweets, image_paths=None):
+    def post_thread(self, tweets, image_paths=None, thread_dir=None):
+        """Post ``tweets`` as a thread, checkpointing every tweet
+        
+        With ``thread_dir`` the checkpoints are kept in its progress.json, so a
+        later call for the same folder continues after the last posted tweet
+        instead of starting over. Failures while composing are retried on the
+        same page, keeping whatever the composer already holds. Threads longer
+        than X_THREAD_CHUNK are posted in parts, each replying to the last.
+        
+        Returns the ids and URLs X assigned to the tweets (see
+        ThreadProgress.result()), also written to the folder's posted.json.
+        """
+        self.step_latencies = []
+        progress = ThreadProgress(tweets, thread_dir)
+        image_paths = self._align_images(len(tweets), image_paths)
+        if progress.done:
+            print("Thread was already posted, nothing to do")
+            return progress.result(tweets)
+        if progress.posted:
+            print(f"Resuming after tweet {progress.posted} of {len(tweets)}")
+        
         try:
-            # Navigate to X
-            self.page.goto('https://twitter.com/home')
-            time.sleep(3)
-            print("Navigated to X")
-            
-            # Post first tweet
-            tweet_input = self.page.wait_for_selector('[data-testid="tweetTextarea_0"]')
-            self._fill_tweet_safely(tweet_input, tweets[0])
-            
-            # Handle first image if available
-            if image_paths and len(image_paths) > 0:
-                print(f"Setting input files for image {image_paths[0]}")
-                file_input = 'input[accept="image/jpeg,image/png,image/webp,image/gif,video/mp4,video/quicktime"]'
-                self.page.set_input_files(file_input, image_paths[0])
-                time.sleep(2)
-            
-            # Check for overlay before clicking add button
-            self._check_and_dismiss_overlay(tweet_input)
-            
-            # After first tweet, click the button to create a thread
-            print("Clicking the add button to create a thread")
-            max_attempts = 5
-            for attempt in range(max_attempts):
+            for attempt in range(self.post_attempts):
                 try:
-                    add_button = self.page.wait_for_selector(
-                        '[data-testid="addButton"]',
-                        timeout=5000,
-                        state='visible'
-                    )
-                    
-                    if add_button:
-                        add_button.click(force=True)
-                        time.sleep(2)
-                        
-                        # Verify a new tweet box appeared
-                        if self.page.locator('[data-testid="tweetTextarea_1"]').is_visible():
-                            print("Successfully added new tweet box")
-                            break
-                        else:
-                            print("New tweet box not visible after click, retrying...")
-                    
+                    while not progress.done:
+                        self._post_chunk(tweets, image_paths, progress)
+                    break
                 except Exception as e:
-                    print(f"Attempt {attempt + 1} failed: {str(e)}")
-                    if attempt == max_attempts - 1:
-                        raise Exception("Failed to click add button after multiple attempts")
-                    time.sleep(2)
+                    if attempt == self.post_attempts - 1:
+                        raise
+                    print(f"Posting attempt {attempt + 1} failed: {e}")
+                    print(f"Retrying from the last checkpoint ({progress.posted} posted, "
+                          f"{len(progress.filled)} in the composer)")
             
-            # Now add remaining tweets to the thread
-            for i in range(1, len(tweets)):
-                print(f"\nAdding tweet {i+1} to the thread")
-                
-                # Wait for the new tweet box
-                new_tweet_box = self.page.wait_for_selector(f'[data-testid="tweetTextarea_{i}"]')
-                self._fill_tweet_safely(new_tweet_box, tweets[i])
-                
-                # Handle image for this tweet if available
-                if image_paths and i < len(image_paths):
-                    image_path = image_paths[i]
-                    image_name = Path(image_path).name
-                    if f"tweet_{i}" in image_name and os.path.exists(image_path):
-                        current_tweet = self.page.locator(f'[data-testid="tweetTextarea_{i}"]')
-                        file_input = current_tweet.locator('xpath=./following::input[@data-testid="fileInput"]').first
-                        file_input.set_input_files(image_path)
-                        time.sleep(1)
-                
-                # Check for overlay before proceeding
-                self._check_and_dismiss_overlay(new_tweet_box)
-                
-                # If there are more tweets to add, click the append button
-                if i < len(tweets) - 1:
-                    print("Clicking add button for next tweet...")
-                    add_button = self.page.wait_for_selector('[data-testid="addButton"]')
-                    add_button.click(force=True)
-                    time.sleep(2)
-            
-            # Check for overlay before final post
-            last_tweet_box = self.page.locator(f'[data-testid="tweetTextarea_{len(tweets)-1}"]')
-            self._check_and_dismiss_overlay(last_tweet_box)
-            
-            # Post the entire thread with retries
-            max_post_attempts = 5
-            for attempt in range(max_post_attempts):
-                try:
-                    post_button = self.page.wait_for_selector('[data-testid="tweetButton"]', timeout=5000)
-                    if post_button.is_enabled():
-                        post_button.click(force=True)
-                        time.sleep(3)
-                        break
-                except Exception as e:
-                    print(f"Post attempt {attempt + 1} failed: {str(e)}")
-                    if attempt == max_post_attempts - 1:
-                        raise Exception("Failed to click post button after multiple attempts")
-                    time.sleep(2)
-            
-            print("Thread posted successfully!")
-            display_menu()
+            result = progress.write_result(tweets)
+            print(f"Thread posted successfully! {result['thread_url']}")
+            self.latency_report()
+            return result
             
         except Exception as e:
             print(f"Error posting thread: {e}")
+            self.latency_report()
             raise
 
+    @staticmethod
+    def _align_images(count, image_paths):
+        """Map image paths to tweet indexes, by their tweet_<i> name when they have one"""
+        aligned = [None] * count
+        for position, path in enumerate(image_paths or []):
+            if not path:
+                continue
+            match = re.fullmatch(r'tweet_(\d+)', Path(path).stem)
+            index = int(match.group(1)) if match else position
+            if index < count:
+                aligned[index] = path
+        return aligned
+
+    def _post_chunk(self, tweets, image_paths, progress):
+        """Compose and post the next run of unposted tweets"""
+        start = progress.posted
+        end = min(start + self.thread_chunk, len(tweets))
+        resume_at = self._open_composer(tweets, progress, start)
+        
+        for i in range(resume_at, end):
+            slot = i - start
+            print(f"\nAdding tweet {i+1} to the thread")
+            tweet_box = self._tweet_box(slot)
+            self._fill_tweet_safely(tweet_box, tweets[i])
+            
+            # Handle image for this tweet if available
+            uploaded = False
+            if image_paths[i] and os.path.exists(image_paths[i]):
+                print(f"Setting input files for image {image_paths[i]}")
+                self._upload_image(slot, image_paths[i], len([j for j in progress.uploaded if j >= start]) + 1)
+                uploaded = True
+            
+            # Check for overlay before moving on
+            self._check_and_dismiss_overlay(tweet_box)
+            progress.mark_filled(i, uploaded)
+        
+        post_button = self._wait_step(
+            "post button enabled",
+            lambda timeout: self._wait_for_any([self._scope + s for s in POST_BUTTON_SELECTORS], timeout)
+        )
+        progress.mark_submitted()
+        with PostCapture(self.page) as capture:
+            post_button.click(force=True)
+            try:
+                # One CreateTweet answer per tweet tells us exactly what went live
+                self._wait_step("post confirmed", lambda timeout: capture.wait(end - start, timeout))
+            except PostRejected:
+                # Everything X accepted before the refusal is live, the rest is not
+                progress.mark_posted(capture.tweets)
+                progress.mark_submitted(False)
+                raise
+            except Exception:
+                # No answer in time: keep what was confirmed but don't assume the rest failed
+                progress.mark_posted(capture.tweets)
+                progress.mark_submitted(True)
+                raise
+        progress.mark_posted(capture.tweets)
+        print(f"Posted tweets {start+1}-{end} of {len(tweets)}: {capture.tweets[-1]['url']}")
+
+    def _open_composer(self, tweets, progress, start):
+        """Get a composer for the tweets from ``start`` on; returns the first tweet still to fill"""
+        resume_at = self._composer_resume_point(tweets, progress, start)
+        if resume_at > start:
+            print(f"Composer still holds tweets {start+1}-{resume_at}, continuing from there")
+            return resume_at
+        if progress.submitted:
+            # The post button was clicked and the composer is gone: the tweets may well be live
+            raise Exception("The previous post attempt may have gone through; check the profile "
+                            "and delete progress.json before posting this thread again")
+        if progress.filled:
+            progress.reset_composer()
+        
+        if start == 0:
+            # Navigate to X, unless this is a warm page already sitting on an empty composer
+            self._scope = ''
+            if not self._composer_is_fresh():
+                self.page.goto(HOME_URL, wait_until='domcontentloaded')
+            print("Navigated to X")
+            if self.router:
+                self.router.report("X home")
+        else:
+            # Continue the thread in the reply dialog of the last posted tweet
+            self._scope = 'div[role="dialog"] '
+            self.page.goto(progress.last_url, wait_until='domcontentloaded')
+            print(f"Replying to {progress.last_url}")
+            if self.router:
+                self.router.report("X status")
+            tweet_id = progress.last_url.rstrip('/').split('/')[-1]
+            reply_button = self._wait_step(
+                "reply button visible",
+                lambda timeout: self._wait_for_any(
+                    [f'article:has(a[href$="/status/{tweet_id}"] time) [data-testid="reply"]'], timeout
+                )
+            )
+            reply_button.click()
+        
+        self._wait_step(
+            "tweetTextarea_0 attached",
+            lambda timeout: self.page.wait_for_selector(
+                f'{self._scope}[data-testid="tweetTextarea_0"]', timeout=timeout
+            )
+        )
+        return start
+
+    def _composer_resume_point(self, tweets, progress, start):
+        """First tweet index the open composer doesn't verifiably hold yet"""
+        if not progress.filled:
+            return start
+        try:
+            resume_at = start
+            expected_uploads = 0
+            for i in range(start, len(tweets)):
+                if i not in progress.filled:
+                    break
+                box = self.page.locator(f'{self._scope}[data-testid="tweetTextarea_{i - start}"]')
+                if not box.count():
+                    break
+                if ' '.join(box.first.inner_text(timeout=1000).split()) != ' '.join(tweets[i].split()):
+                    break
+                if i in progress.uploaded:
+                    expected_uploads += 1
+                resume_at = i + 1
+            if resume_at > start and self._attachment_count() < expected_uploads:
+                return start
+            return resume_at
+        except Exception:
+            return start
+
+    def _attachment_count(self):
+        return self.page.evaluate(
+            """() => document.querySelectorAll('[data-testid="attachments"] img, '
+                + '[data-testid="attachments"] video').length"""
+        )
+
+    def _tweet_box(self, slot):
+        """Return composer box ``slot``, clicking the add button if it doesn't exist yet"""
+        selector = f'{self._scope}[data-testid="tweetTextarea_{slot}"]'
+        if slot == 0 or self.page.locator(selector).count():
+            return self._wait_step(
+                f"tweetTextarea_{slot} attached",
+                lambda timeout: self.page.wait_for_selector(selector, timeout=timeout)
+            )
+        return self._add_tweet_box(slot)
+
+    def _upload_image(self, slot, image_path, expected):
+        """Attach an image to composer box ``slot`` and wait for ``expected`` previews"""
+        if slot == 0 and not self._scope:
+            self.page.set_input_files(FILE_INPUT, image_path)
+        else:
+            current_tweet = self.page.locator(f'{self._scope}[data-testid="tweetTextarea_{slot}"]')
+            file_input = current_tweet.locator('xpath=./following::input[@data-testid="fileInput"]').first
+            file_input.set_input_files(image_path)
+        self._wait_step(
+            f"media preview {slot+1} rendered",
+            lambda timeout: self._wait_for_attachments(expected, timeout)
+        )
+
+    def _composer_is_fresh(self):
+        """Check whether the page is on the home timeline with an untouched composer"""
+        try:
+            if '/home' not in self.page.url:
+                return False
+            if self.page.locator('[data-testid="tweetTextarea_1"]').count():
+                return False
+            box = self.page.locator('[data-testid="tweetTextarea_0"]')
+            return box.count() == 1 and not box.inner_text(timeout=1000).strip()
+        except Exception:
+            return False
+
+    def _add_tweet_box(self, index):
+        """Click the add button and wait for ``tweetTextarea_{index}`` to attach"""
+        add_button = self._wait_step(
+            "add button visible",
+            lambda timeout: self.page.wait_for_selector(
+                f'{self._scope}[data-testid="addButton"]', timeout=timeout, state='visible'
+            )
+        )
+        add_button.click(force=True)
+        return self._wait_step(
+            f"tweetTextarea_{index} attached",
+            lambda timeout: self.page.wait_for_selector(
+                f'{self._scope}[data-testid="tweetTextarea_{index}"]', timeout=timeout
+            )
+        )
+
     def test_hashtag_handling(self):
         """Test method to verify hashtag handling in threads"""
         try: